@@ -0,0 +1,146 @@
+import asyncio
+import os
+
+from fastapi import HTTPException
+
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "64"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))
+
+
+class admission_ticket:
+    """
+    A granted admission. release can be called any number of times, only the first
+    call frees the slot and the session.
+    """
+
+    def __init__(self, controller: "admission_controller", session_id: str):
+        self.controller = controller
+        self.session_id = session_id
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller.release(self.session_id)
+
+
+class admission_controller:
+    """
+    Admission control for model streams.
+
+    Requests of the same session run one at a time, in arrival order, and wait for
+    the previous one without a time limit. At most max_concurrency requests run at
+    once. Requests waiting for a free slot form a queue of at most max_queue
+    entries. They are rejected with 429 when the queue is full and with 503 when
+    they waited for a slot longer than queue_timeout seconds.
+
+    Parameters:
+    max_concurrency (int): Number of requests allowed to run at once.
+    max_queue (int): Number of requests allowed to wait.
+    queue_timeout (float): Seconds a request may wait for a slot before it is
+        rejected.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session_locks: dict[str, asyncio.Lock] = {}
+        self.session_users: dict[str, int] = {}
+
+        self.active = 0
+        self.waiting_for_session = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    async def admit(self, session_id: str) -> admission_ticket:
+        """
+        Waits until the session is free and a slot is available.
+
+        Raises:
+        HTTPException: 429 if the wait queue is full, 503 if the wait timed out.
+        """
+        lock = self.session_locks.setdefault(session_id, asyncio.Lock())
+        self.session_users[session_id] = self.session_users.get(session_id, 0) + 1
+
+        self.waiting_for_session += 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self.leave_session(session_id)
+            raise
+        finally:
+            self.waiting_for_session -= 1
+
+        try:
+            await self.acquire_slot()
+        except BaseException:
+            lock.release()
+            self.leave_session(session_id)
+            raise
+
+        self.active += 1
+        self.admitted += 1
+
+        return admission_ticket(self, session_id)
+
+    async def acquire_slot(self):
+        if self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many chat requests waiting, try again later.",
+                headers={"Retry-After": "1"},
+            )
+
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self.semaphore.acquire()
+        except TimeoutError:
+            self.rejected_timeout += 1
+            raise HTTPException(
+                status_code=503,
+                detail="The chatbot is busy, try again later.",
+                headers={"Retry-After": str(int(self.queue_timeout))},
+            )
+        finally:
+            self.queued -= 1
+
+    def release(self, session_id: str):
+        self.active -= 1
+        self.semaphore.release()
+        self.session_locks[session_id].release()
+        self.leave_session(session_id)
+
+    def leave_session(self, session_id: str):
+        self.session_users[session_id] -= 1
+        if self.session_users[session_id] == 0:
+            del self.session_users[session_id]
+            del self.session_locks[session_id]
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting_for_session": self.waiting_for_session,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "sessions": len(self.session_locks),
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+chat_admission = admission_controller(
+    CHAT_MAX_CONCURRENCY, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT
+)
@@ -0,0 +1,270 @@
+import json
+import math
+import os
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from random import Random
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boto3  # noqa: E402
+
+import dynamodb_client  # noqa: E402
+from service_index import get_service_index  # noqa: E402
+
+PING_TABLE_NAME = "PingDB"
+CHAT_HISTORY_TABLE_NAME = "chat_history"
+
+
+def attribute_size(value: dict) -> int:
+    """
+    Estimates the stored size of a DynamoDB attribute value with the rules used for
+    capacity accounting.
+    """
+    ((kind, data),) = value.items()
+
+    if kind in ("S", "B"):
+        return len(data.encode() if isinstance(data, str) else data)
+    if kind == "N":
+        return len(Decimal(data).normalize().as_tuple().digits) // 2 + 2
+    if kind in ("BOOL", "NULL"):
+        return 1
+    if kind == "L":
+        return 3 + sum(attribute_size(element) + 1 for element in data)
+    if kind == "M":
+        return 3 + item_size(data) + len(data)
+    if kind in ("SS", "BS", "NS"):
+        return sum(attribute_size({kind[0]: element}) for element in data)
+
+    raise ValueError(kind)
+
+
+def item_size(item: dict) -> int:
+    return sum(
+        len(name.encode()) + attribute_size(value) for name, value in item.items()
+    )
+
+
+class capacity_meter:
+    """
+    Counts the DynamoDB calls made through a boto3 session and estimates the capacity
+    units real DynamoDB would charge for them. moto reports a constant consumed
+    capacity per call, so the estimate is computed from item sizes instead:
+
+    - reads cost 0.5 units (1 if strongly consistent) per 4 KB read, where a query or
+      scan page reads every item it evaluates, not only the ones returned;
+    - writes cost 1 unit per 1 KB of the larger of the item before and after.
+
+    Timings include moto and the meter's own lookups, so they are only comparable
+    within a run.
+
+    Parameters:
+    read_item_size (int): Size assumed for items evaluated by queries and scans.
+    """
+
+    def __init__(self, read_item_size: int = 0):
+        self.read_item_size = read_item_size
+
+        self.session = boto3.session.Session()
+        self.session.events.register("before-call.dynamodb", self.measure_before)
+        self.session.events.register("after-call.dynamodb", self.record)
+
+        # Unhooked client, used to look at stored items without counting the reads.
+        self.inspector = boto3.session.Session().client("dynamodb")
+        self.key_names = {}
+
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.items_read = 0
+        self.items_returned = 0
+        self.writes = 0
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.reported_units = 0.0
+        self.started = time.perf_counter()
+
+    def client(self):
+        return self.session.client("dynamodb")
+
+    def stored_item_size(self, request: dict) -> int:
+        table_name = request["TableName"]
+        if table_name not in self.key_names:
+            table = self.inspector.describe_table(TableName=table_name)["Table"]
+            self.key_names[table_name] = [
+                key["AttributeName"] for key in table["KeySchema"]
+            ]
+
+        key = request.get("Key") or {
+            name: request["Item"][name] for name in self.key_names[table_name]
+        }
+        response = self.inspector.get_item(
+            TableName=table_name, Key=key, ConsistentRead=True
+        )
+
+        return item_size(response.get("Item", {}))
+
+    def measure_before(self, params: dict, model, context: dict, **kwargs):
+        request = json.loads(params["body"] or "{}")
+        context["benchmark_request"] = request
+
+        if model.name in ("PutItem", "UpdateItem"):
+            context["benchmark_size_before"] = self.stored_item_size(request)
+
+    def record(self, http_response, parsed: dict, model, context: dict, **kwargs):
+        if "Error" in parsed:
+            return
+
+        self.calls += 1
+        self.reported_units += parsed.get("ConsumedCapacity", {}).get(
+            "CapacityUnits", 0
+        )
+
+        request = context["benchmark_request"]
+        if model.name in ("Query", "Scan"):
+            self.items_read += parsed["ScannedCount"]
+            self.items_returned += parsed["Count"]
+            self.read_units += 0.5 * math.ceil(
+                parsed["ScannedCount"] * self.read_item_size / 4096
+            )
+        elif model.name == "GetItem":
+            self.items_read += 1
+            self.items_returned += 1 if "Item" in parsed else 0
+            size = item_size(parsed.get("Item", {}))
+            self.read_units += (1 if request.get("ConsistentRead") else 0.5) * max(
+                math.ceil(size / 4096), 1
+            )
+        elif model.name in ("PutItem", "UpdateItem"):
+            self.writes += 1
+            size = max(context["benchmark_size_before"], self.stored_item_size(request))
+            self.write_units += max(math.ceil(size / 1024), 1)
+
+    def row(self, label: str, extra: str = "") -> str:
+        elapsed = (time.perf_counter() - self.started) * 1000
+        return (
+            f"{label:<34} {self.calls:>6} {self.items_read:>8} "
+            f"{self.items_returned:>8} {self.read_units:>9.1f} "
+            f"{self.write_units:>9.1f} {self.reported_units:>9.1f} "
+            f"{elapsed:>9.1f}  {extra}"
+        ).rstrip()
+
+
+HEADER = (
+    f"{'':<34} {'calls':>6} {'read':>8} {'returned':>8} {'est. RCU':>9} "
+    f"{'est. WCU':>9} {'moto CU':>9} {'ms':>9}"
+)
+
+
+def use_client(meter: capacity_meter):
+    """
+    Points dynamodb_client at a client of the meter's session, so the repo's own
+    queries and writes are counted.
+    """
+    dynamodb_client._client = meter.client()
+
+
+def create_ping_table(
+    client, table_name: str = PING_TABLE_NAME, with_destination_index: bool = True
+):
+    attribute_definitions = [
+        {"AttributeName": "origin", "AttributeType": "S"},
+        {"AttributeName": "destination#timestamp", "AttributeType": "S"},
+    ]
+    kwargs = {}
+    if with_destination_index:
+        attribute_definitions += [
+            {"AttributeName": "destination", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ]
+        kwargs["GlobalSecondaryIndexes"] = [
+            {
+                "IndexName": "destination-timestamp-index",
+                "KeySchema": [
+                    {"AttributeName": "destination", "KeyType": "HASH"},
+                    {"AttributeName": "timestamp", "KeyType": "RANGE"},
+                ],
+                "Projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": ["latency"],
+                },
+            }
+        ]
+
+    client.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "origin", "KeyType": "HASH"},
+            {"AttributeName": "destination#timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=attribute_definitions,
+        BillingMode="PAY_PER_REQUEST",
+        **kwargs,
+    )
+
+
+def ping_item(origin: str, destination: str, timestamp: str, latency: float) -> dict:
+    return {
+        "origin": {"S": origin},
+        "destination": {"S": destination},
+        "timestamp": {"S": timestamp},
+        "destination#timestamp": {"S": f"{destination}#{timestamp}"},
+        "latency": {"N": f"{latency:.3f}"},
+    }
+
+
+def put_items(client, table_name: str, items: list[dict]):
+    for i in range(0, len(items), 25):
+        client.batch_write_item(
+            RequestItems={
+                table_name: [
+                    {"PutRequest": {"Item": item}} for item in items[i : i + 25]
+                ]
+            }
+        )
+
+
+def seed_pings(
+    client,
+    sources: list[str],
+    destinations: list[str],
+    count: int,
+    table_name: str = PING_TABLE_NAME,
+) -> tuple[datetime, int]:
+    """
+    Writes count pings, five minutes apart and ending now, for every source and
+    destination pair.
+
+    Returns:
+    tuple[datetime, int]: The time of the latest ping and the size of a ping item.
+    """
+    end = datetime.now(UTC).replace(microsecond=0, tzinfo=None)
+    random = Random(0)
+
+    items = [
+        ping_item(
+            source,
+            destination,
+            (end - timedelta(minutes=5 * i)).isoformat(),
+            random.uniform(1, 300),
+        )
+        for source in sources
+        for destination in destinations
+        for i in range(count)
+    ]
+    put_items(client, table_name, items)
+
+    return end, item_size(items[0])
+
+
+def region_names(count: int) -> list[str]:
+    """
+    Returns up to count AWS region codes, taken from the regions that offer EC2.
+    """
+    return list(get_service_index().regions("ec2")[:count])
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import re
+from datetime import timedelta
+
+from boto3.dynamodb.conditions import Attr
+from moto import mock_aws
+
+from common import *
+
+import ping_queries
+import tools
+
+
+def old_nth_ping_given_destination(
+    table, destination: str, n: int, lower: str, upper: str
+) -> str:
+    """
+    get_nth_ping_given_destination before the destination index: one scan of the
+    whole table, filtered after reading, that stopped after the first page.
+    """
+    items = table.scan(
+        FilterExpression=Attr("destination").eq(destination)
+        & Attr("timestamp").between(lower, upper)
+    )["Items"]
+
+    latest_pings = {}
+    for item in items:
+        current = latest_pings.get(item["origin"])
+        if current is None or item["timestamp"] > current["timestamp"]:
+            latest_pings[item["origin"]] = item
+
+    ranked = sorted(latest_pings.values(), key=lambda item: float(item["latency"]))
+    return str(ranked[n - 1]) if len(ranked) >= n else "not enough sources"
+
+
+def nth_source(result: str) -> str:
+    match = re.search(r"'origin': '([^']+)'", result)
+    return f"lowest from {match.group(1)}" if match else result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the reads of get_nth_ping_given_destination with a table "
+        "scan and with the destination index, against moto ping tables of growing "
+        "size. moto index queries slow down as the table grows, so only the items and "
+        "capacity units read say how the tool scales, not the timings."
+    )
+    parser.add_argument("--regions", type=int, default=8, help="sources = destinations")
+    parser.add_argument(
+        "--pings", type=int, nargs="+", default=[12, 48, 192], help="pings per pair"
+    )
+    parser.add_argument("--minutes", type=int, default=60, help="queried time range")
+    args = parser.parse_args()
+
+    regions = region_names(args.regions)
+    print(f"{len(regions)} sources x {len(regions)} destinations\n")
+    print(HEADER)
+
+    for pings in args.pings:
+        # A table per size, since a table found without the index stays marked.
+        table_name = f"{PING_TABLE_NAME}-{pings}"
+
+        with mock_aws():
+            meter = capacity_meter()
+            create_ping_table(meter.inspector, table_name)
+            end, meter.read_item_size = seed_pings(
+                meter.inspector, regions, regions, pings, table_name
+            )
+            use_client(meter)
+            table = meter.session.resource("dynamodb").Table(table_name)
+
+            lower = (end - timedelta(minutes=args.minutes)).isoformat()
+            upper = end.isoformat()
+            size = f"{len(regions) ** 2 * pings} items"
+
+            tool_args = {
+                "destination": regions[0],
+                "table_name": table_name,
+                "n": 1,
+                "time_lower_bound": lower,
+                "time_upper_bound": upper,
+            }
+
+            meter.reset()
+            result = old_nth_ping_given_destination(table, regions[0], 1, lower, upper)
+            print(meter.row(f"{size}: first scan page", nth_source(result)))
+
+            meter.reset()
+            result = asyncio.run(
+                tools.get_nth_ping_given_destination.ainvoke(tool_args)
+            )
+            print(meter.row(f"{size}: destination index", nth_source(result)))
+
+            ping_queries.mark_missing_destination_index(table_name)
+            meter.reset()
+            result = asyncio.run(
+                tools.get_nth_ping_given_destination.ainvoke(tool_args)
+            )
+            print(meter.row(f"{size}: parallel scan", nth_source(result)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+
+from langchain_community.chat_message_histories import DynamoDBChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from moto import mock_aws
+
+from common import *
+
+from chat_history import dynamodb_chat_history, sessions
+
+
+def chat_turn(i: int, text_chars: int, tool_chars: int) -> list[BaseMessage]:
+    """
+    A turn with one tool call: the question, the call, its result and the answer.
+    """
+    tool_call = {"name": "get_pings", "args": {"latest": True}, "id": f"call_{i}"}
+    return [
+        HumanMessage(f"Question {i}? " + "q" * (text_chars // 4)),
+        AIMessage("", tool_calls=[tool_call]),
+        ToolMessage("t" * tool_chars, tool_call_id=f"call_{i}"),
+        AIMessage(f"Answer {i}. " + "a" * text_chars),
+    ]
+
+
+def old_turn(meter: capacity_meter, session_id: str, turn: list[BaseMessage]):
+    """
+    A turn with DynamoDBChatMessageHistory behind RunnableWithMessageHistory: the
+    history is read for the prompt, then every message reads and rewrites the item.
+    """
+    history = DynamoDBChatMessageHistory(
+        CHAT_HISTORY_TABLE_NAME, session_id, boto3_session=meter.session
+    )
+    history.messages
+    history.add_messages(turn)
+
+
+async def new_turn(session_id: str, turn: list[BaseMessage], cached: bool):
+    if not cached:
+        sessions.invalidate(session_id)
+
+    history = dynamodb_chat_history(CHAT_HISTORY_TABLE_NAME, session_id)
+    await history.aget_messages()
+    await history.aadd_messages(turn)
+    await history.acommit()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the chat history reads and writes of a conversation "
+        "stored one message at a time and one turn at a time, against moto."
+    )
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--text-chars", type=int, default=600)
+    parser.add_argument("--tool-chars", type=int, default=2000)
+    args = parser.parse_args()
+
+    turns = [chat_turn(i, args.text_chars, args.tool_chars) for i in range(args.turns)]
+    print(f"{args.turns} turns of {len(turns[0])} messages\n")
+    print(HEADER)
+
+    with mock_aws():
+        meter = capacity_meter()
+        meter.inspector.create_table(
+            TableName=CHAT_HISTORY_TABLE_NAME,
+            KeySchema=[{"AttributeName": "SessionId", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "SessionId", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        use_client(meter)
+
+        def per_turn() -> str:
+            return (
+                f"{meter.writes / args.turns:.1f} writes, "
+                f"{meter.write_units / args.turns:.1f} WCU per turn"
+            )
+
+        meter.reset()
+        for turn in turns:
+            old_turn(meter, "old", turn)
+        print(meter.row("put_item per message", per_turn()))
+
+        for cached in (False, True):
+            session_id = f"new-{cached}"
+
+            meter.reset()
+            for turn in turns:
+                asyncio.run(new_turn(session_id, turn, cached))
+            label = "update_item per turn" + (", cached" if cached else "")
+            print(meter.row(label, per_turn()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+from datetime import timedelta
+
+from boto3.dynamodb.conditions import Attr, Key
+from moto import mock_aws
+
+from common import *
+
+import tools
+
+
+def old_get_pings(
+    table, source_region: str, destination: str, latest: bool, lower: str, upper: str
+) -> list[dict]:
+    """
+    get_pings before it bounded the sort key: the time range was a filter, applied
+    after every ping of the pair was read, and only the first page was returned.
+    """
+    key_conditions = Key("origin").eq(source_region) & Key(
+        "destination#timestamp"
+    ).begins_with(destination + "#")
+
+    filter_expression = Attr("destination").eq(destination)
+    if latest:
+        return table.query(
+            KeyConditionExpression=key_conditions,
+            FilterExpression=filter_expression,
+            ScanIndexForward=False,
+            Limit=1,
+        )["Items"]
+
+    filter_expression &= Attr("timestamp").between(lower, upper)
+    return table.query(
+        KeyConditionExpression=key_conditions, FilterExpression=filter_expression
+    )["Items"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the reads of get_pings with the time range as a filter "
+        "and as a sort key condition, against a moto ping table."
+    )
+    parser.add_argument("--destinations", type=int, default=10)
+    parser.add_argument("--pings", type=int, default=2016, help="pings per pair")
+    parser.add_argument("--minutes", type=int, default=60, help="queried time range")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with mock_aws():
+        meter = capacity_meter()
+        create_ping_table(meter.inspector)
+        destinations = region_names(args.destinations)
+        end, meter.read_item_size = seed_pings(
+            meter.inspector, ["us-east-1"], destinations, args.pings
+        )
+        use_client(meter)
+        table = meter.session.resource("dynamodb").Table(PING_TABLE_NAME)
+
+        lower = (end - timedelta(minutes=args.minutes)).isoformat()
+        upper = end.isoformat()
+        bounds = {"time_lower_bound": lower, "time_upper_bound": upper}
+        print(
+            f"{len(destinations)} destinations x {args.pings} pings, "
+            f"{args.repeat} calls each, ranges of {args.minutes} minutes\n"
+        )
+        print(HEADER)
+
+        for latest in (True, False):
+            name = "latest" if latest else "range"
+
+            meter.reset()
+            for i in range(args.repeat):
+                old_get_pings(
+                    table,
+                    "us-east-1",
+                    destinations[i % len(destinations)],
+                    latest,
+                    lower,
+                    upper,
+                )
+            print(meter.row(f"{name}: filter on timestamp"))
+
+            meter.reset()
+            for i in range(args.repeat):
+                asyncio.run(
+                    tools.get_pings.ainvoke(
+                        {
+                            "source_region": "us-east-1",
+                            "destination": destinations[i % len(destinations)],
+                            "table_name": PING_TABLE_NAME,
+                            "latest": latest,
+                        }
+                        | ({} if latest else bounds)
+                    )
+                )
+            print(meter.row(f"{name}: bounded sort key"))
+
+
+if __name__ == "__main__":
+    main()
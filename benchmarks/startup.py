@@ -0,0 +1,127 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """
+    Parses the -X importtime report of a process.
+
+    Returns:
+    list[tuple[str, int, int]]: Module name, self and cumulative microseconds, in
+        the order the imports finished.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return modules
+
+
+def importer(stderr: str, module: str) -> str | None:
+    """
+    Finds the module whose import first pulled in module. -X importtime reports
+    nested imports before their parent, indented one level deeper.
+    """
+    depth = None
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        name = line.split("|")[2]
+        indent = len(name) - len(name.lstrip())
+        if depth is None:
+            if name.strip() == module:
+                depth = indent
+        elif indent < depth:
+            return name.strip()
+
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Imports a module in a fresh interpreter with -X importtime and "
+        "reports the total import time, the slowest modules and the peak memory."
+    )
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--max-ms", type=float, help="exit with status 1 above this total import time"
+    )
+    parser.add_argument(
+        "--watch",
+        nargs="*",
+        default=["numpy", "langchain_community"],
+        help="packages whose startup import cost is reported",
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    for name, value in (
+        ("AWS_DEFAULT_REGION", "us-east-1"),
+        ("BEDROCK_MODEL_ID", "benchmark"),
+        ("CHATBOT_API_KEY", "benchmark"),
+    ):
+        env.setdefault(name, value)
+
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    if process.returncode:
+        print(process.stderr[-2000:])
+        sys.exit(process.returncode)
+
+    modules = parse_importtime(process.stderr)
+    total_ms = sum(self_us for _, self_us, _ in modules) / 1000
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    max_rss_mb = max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+    print(f"import {args.module}: {len(modules)} modules")
+    print(f"total import time {total_ms:.1f} ms, process {elapsed * 1000:.1f} ms")
+    print(f"max rss {max_rss_mb:.1f} MB")
+
+    for title, column in (("self", 1), ("cumulative", 2)):
+        print(f"\ntop {args.top} by {title} time")
+        print(f"{'ms':>9} {'self ms':>9}  module")
+        ranked = sorted(modules, key=lambda module: module[column], reverse=True)
+        for module in ranked[: args.top]:
+            ms, self_ms = module[column] / 1000, module[1] / 1000
+            print(f"{ms:>9.1f} {self_ms:>9.1f}  {module[0]}")
+
+    imported = {name: cumulative_us for name, _, cumulative_us in modules}
+    print()
+    for name in args.watch:
+        if name in imported:
+            print(
+                f"{name}: imported at startup by "
+                f"{importer(process.stderr, name)}, {imported[name] / 1000:.1f} ms"
+            )
+        else:
+            print(f"{name}: not imported at startup")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"\nimport time {total_ms:.1f} ms is above {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
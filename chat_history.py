@@ -0,0 +1,397 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Iterator
+
+from botocore.exceptions import ClientError
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+    messages_from_dict,
+    messages_to_dict,
+)
+
+from dynamodb_client import (
+    deserialize_item,
+    get_dynamodb_client,
+    record_write,
+    serialize_value,
+)
+from prompts import *
+
+HISTORY_VERBATIM_TURNS = int(os.getenv("HISTORY_VERBATIM_TURNS", "4"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+HISTORY_SUMMARY_TOKEN_BUDGET = int(os.getenv("HISTORY_SUMMARY_TOKEN_BUDGET", "1000"))
+HISTORY_TOOL_DIGEST_CHARS = int(os.getenv("HISTORY_TOOL_DIGEST_CHARS", "300"))
+HISTORY_SUMMARY_LINE_CHARS = 200
+HISTORY_COMMIT_RETRIES = int(os.getenv("HISTORY_COMMIT_RETRIES", "2"))
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "1000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 2**20)))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "300"))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in message.content
+    )
+
+
+def split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """
+    Groups messages into turns, each starting with a human message and followed by
+    the AI and tool messages answering it.
+    """
+    turns = []
+    for message in messages:
+        if message.type == "human" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+
+    return turns
+
+
+def turn_tokens(turn: list[BaseMessage]) -> int:
+    return sum(estimate_tokens(str(message.content)) for message in turn)
+
+
+def digest_turn(turn: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Replaces long tool results of a turn with their beginning and original length.
+    """
+    digested = []
+    for message in turn:
+        content = str(message.content)
+        if (
+            isinstance(message, ToolMessage)
+            and len(content) > HISTORY_TOOL_DIGEST_CHARS
+        ):
+            message = ToolMessage(
+                TOOL_RESULT_DIGEST.format(
+                    content[:HISTORY_TOOL_DIGEST_CHARS], len(content)
+                ),
+                tool_call_id=message.tool_call_id,
+            )
+        digested.append(message)
+
+    return digested
+
+
+def summarize_turn(turn: list[BaseMessage]) -> str:
+    question = message_text(turn[0]).split(MESSAGE_TIME_STAMP.split("{}")[0])[0]
+    answers = [message_text(message) for message in turn[1:] if message.type != "tool"]
+    answer = next((text for text in reversed(answers) if text.strip()), "")
+
+    return "- User: {} | Assistant: {}".format(
+        question.strip()[:HISTORY_SUMMARY_LINE_CHARS],
+        answer.strip()[:HISTORY_SUMMARY_LINE_CHARS],
+    )
+
+
+def apply_history_policy(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Shrinks a session's messages before they are sent to the model.
+
+    The last HISTORY_VERBATIM_TURNS turns are kept as they are. Tool results of older
+    turns are cut down to digests. If the older turns still exceed
+    HISTORY_TOKEN_BUDGET, the oldest are folded into a rolling summary of questions
+    and answers, capped at HISTORY_SUMMARY_TOKEN_BUDGET.
+
+    Parameters:
+    messages (list[BaseMessage]): The full transcript of the session.
+
+    Returns:
+    list[BaseMessage]: The messages to send to the model.
+    """
+    turns = split_turns(messages)
+
+    recent = (
+        turns[len(turns) - HISTORY_VERBATIM_TURNS :] if HISTORY_VERBATIM_TURNS else []
+    )
+    older = [digest_turn(turn) for turn in turns[: len(turns) - len(recent)]]
+
+    summarized = []
+    tokens = sum(turn_tokens(turn) for turn in older)
+    while older and tokens > HISTORY_TOKEN_BUDGET:
+        turn = older.pop(0)
+        tokens -= turn_tokens(turn)
+        summarized.append(turn)
+
+    window = []
+    if summarized:
+        lines = [summarize_turn(turn) for turn in summarized]
+        while (
+            len(lines) > 1
+            and estimate_tokens("\n".join(lines)) > HISTORY_SUMMARY_TOKEN_BUDGET
+        ):
+            lines.pop(0)
+
+        window.append(HumanMessage(HISTORY_SUMMARY.format("\n".join(lines))))
+        window.append(AIMessage(HISTORY_SUMMARY_ACKNOWLEDGEMENT))
+
+    for turn in older + recent:
+        window.extend(turn)
+
+    return window
+
+
+def history_entries(
+    messages: list[BaseMessage],
+    offset: int = 0,
+    limit: int = None,
+    newest_first: bool = False,
+    text_only: bool = False,
+) -> tuple[int, Iterator[dict]]:
+    """
+    Selects a page of a transcript and converts it to the /get-history format.
+
+    Parameters:
+    messages (list[BaseMessage]): The full transcript of the session.
+    offset (int): Number of messages to skip.
+    limit (int): Maximum number of messages to return. Defaults to all.
+    newest_first (bool): Set to True to page from the latest message backwards.
+    text_only (bool): Set to True to skip tool results and tool call blocks, keeping
+        only the text of human and AI messages.
+
+    Returns:
+    tuple[int, Iterator[dict]]: The number of messages before paging, and the type
+    and content of each selected message, converted lazily.
+    """
+    if text_only:
+        messages = [
+            message
+            for message in messages
+            if message.type != "tool" and message_text(message).strip()
+        ]
+
+    if newest_first:
+        messages = messages[::-1]
+
+    end = None if limit is None else offset + limit
+    entries = (
+        {
+            "type": message.type,
+            "content": message_text(message) if text_only else message.content,
+        }
+        for message in messages[offset:end]
+    )
+
+    return len(messages), entries
+
+
+class session_cache:
+    """
+    LRU cache of committed session transcripts, bounded by number of sessions and by
+    the estimated size of their messages. Entries expire after ttl seconds so that
+    writes from other processes are eventually picked up.
+
+    Parameters:
+    max_sessions (int): Maximum number of cached sessions.
+    max_bytes (int): Maximum estimated size of all cached messages.
+    ttl (float): Seconds an entry is served before it is reloaded.
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.entries: OrderedDict[str, tuple[list[BaseMessage], int, int, float]] = (
+            OrderedDict()
+        )
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> tuple[list[BaseMessage], int] | None:
+        entry = self.entries.get(session_id)
+        if entry is None or time.monotonic() - entry[3] >= self.ttl:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(session_id)
+
+        return entry[0], entry[1]
+
+    def put(self, session_id: str, messages: list[BaseMessage], version: int):
+        self.invalidate(session_id)
+
+        size = sum(len(str(message.content)) + 100 for message in messages)
+        if size > self.max_bytes:
+            return
+
+        self.entries[session_id] = (messages, version, size, time.monotonic())
+        self.bytes += size
+
+        while len(self.entries) > self.max_sessions or self.bytes > self.max_bytes:
+            _, (_, _, evicted_size, _) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, session_id: str):
+        entry = self.entries.pop(session_id, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+sessions = session_cache(
+    SESSION_CACHE_MAX_SESSIONS, SESSION_CACHE_MAX_BYTES, SESSION_CACHE_TTL
+)
+
+
+class dynamodb_chat_history(BaseChatMessageHistory):
+    """
+    Full transcript of a session, stored in the "History" attribute of its item in
+    the chat history table together with a "Version" counter.
+
+    Messages added during a turn are only buffered. acommit appends all of them with
+    a single update conditioned on the version that was loaded, so a failed turn is
+    rolled back by discarding it instead of rewriting the item. Committed transcripts
+    are read from and written through to the process-wide session cache.
+
+    Parameters:
+    table_name (str): Name of the chat history table.
+    session_id (str): Session id, the partition key of the item.
+    """
+
+    def __init__(self, table_name: str, session_id: str):
+        self.table_name = table_name
+        self.session_id = session_id
+
+        self.committed: list[BaseMessage] | None = None
+        self.version = 0
+        self.pending: list[BaseMessage] = []
+
+    @property
+    def key(self) -> dict:
+        return {"SessionId": {"S": self.session_id}}
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        if self.committed is None:
+            self.load()
+
+        return self.committed + self.pending
+
+    async def aget_messages(self) -> list[BaseMessage]:
+        if self.committed is None:
+            await asyncio.to_thread(self.load)
+
+        return self.committed + self.pending
+
+    def load(self, use_cache: bool = True):
+        cached = sessions.get(self.session_id) if use_cache else None
+        if cached is not None:
+            self.committed, self.version = cached
+            return
+
+        response = get_dynamodb_client().get_item(
+            TableName=self.table_name,
+            Key=self.key,
+            ConsistentRead=True,
+            ProjectionExpression="History, Version",
+        )
+        item = deserialize_item(response.get("Item", {}))
+
+        self.committed = messages_from_dict(item.get("History", []))
+        self.version = int(item.get("Version", 0))
+        sessions.put(self.session_id, self.committed, self.version)
+
+    def add_messages(self, messages: list[BaseMessage]):
+        self.pending.extend(messages)
+
+    async def aadd_messages(self, messages: list[BaseMessage]):
+        self.add_messages(messages)
+
+    def discard(self):
+        """
+        Drops the buffered messages of a failed turn. Nothing has been written for
+        them, so the stored transcript is left as it was before the turn.
+        """
+        self.pending = []
+
+    async def acommit(self):
+        """
+        Appends the buffered messages to the stored transcript in one versioned
+        write. If another turn was committed since the transcript was loaded, the
+        transcript is reloaded and the messages are appended after that turn.
+
+        Raises:
+        ClientError: If the write still conflicts after HISTORY_COMMIT_RETRIES retries.
+        """
+        if not self.pending:
+            return
+
+        if self.committed is None:
+            await asyncio.to_thread(self.load)
+
+        for attempt in range(HISTORY_COMMIT_RETRIES + 1):
+            try:
+                response = await asyncio.to_thread(
+                    get_dynamodb_client().update_item,
+                    TableName=self.table_name,
+                    Key=self.key,
+                    UpdateExpression="SET History = list_append(if_not_exists(History, :empty), :messages), Version = :next",
+                    ConditionExpression="Version = :version OR (attribute_not_exists(Version) AND (attribute_not_exists(History) OR size(History) = :count))",
+                    ExpressionAttributeValues={
+                        ":empty": {"L": []},
+                        ":messages": serialize_value(messages_to_dict(self.pending)),
+                        ":version": {"N": str(self.version)},
+                        ":next": {"N": str(self.version + 1)},
+                        ":count": {"N": str(len(self.committed))},
+                    },
+                    ReturnConsumedCapacity="TOTAL",
+                )
+                record_write(response)
+
+                break
+            except ClientError as e:
+                if (
+                    e.response["Error"]["Code"] != "ConditionalCheckFailedException"
+                    or attempt == HISTORY_COMMIT_RETRIES
+                ):
+                    raise
+
+                print(e)
+                await asyncio.to_thread(self.load, False)
+
+        self.committed = self.committed + self.pending
+        self.version += 1
+        self.pending = []
+        sessions.put(self.session_id, self.committed, self.version)
+
+    def clear(self):
+        sessions.invalidate(self.session_id)
+        get_dynamodb_client().delete_item(TableName=self.table_name, Key=self.key)
+        sessions.invalidate(self.session_id)
+
+        self.committed = []
+        self.version = 0
+        self.pending = []
+
+    async def aclear(self):
+        await asyncio.to_thread(self.clear)
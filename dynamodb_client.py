@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+from decimal import Decimal
+from typing import AsyncGenerator
+
+import boto3
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+DYNAMODB_MAX_POOL_CONNECTIONS = int(os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", "50"))
+DYNAMODB_SCAN_SEGMENTS = int(os.getenv("DYNAMODB_SCAN_SEGMENTS", "8"))
+DYNAMODB_SCAN_WORKERS = int(os.getenv("DYNAMODB_SCAN_WORKERS", "4"))
+
+_client = None
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+consumed_capacity = {
+    "queries": 0,
+    "scans": 0,
+    "pages": 0,
+    "items": 0,
+    "read_capacity_units": 0.0,
+    "writes": 0,
+    "write_capacity_units": 0.0,
+}
+
+
+def get_dynamodb_client():
+    """
+    Returns the process-wide low-level DynamoDB client. Unlike boto3 resources the
+    client is thread-safe, so pages can be fetched from worker threads.
+    """
+    global _client
+
+    if _client is None:
+        _client = boto3.session.Session().client(
+            "dynamodb",
+            config=Config(max_pool_connections=DYNAMODB_MAX_POOL_CONNECTIONS),
+        )
+
+    return _client
+
+
+def build_expression_kwargs(
+    key_condition: ConditionBase = None,
+    filter_expression: ConditionBase = None,
+    projection: list[str] = None,
+) -> dict:
+    """
+    Turns boto3 condition objects into the expression parameters of a low-level
+    query or scan call.
+
+    Parameters:
+    key_condition (ConditionBase): Key condition, e.g. Key("origin").eq("us-east-1").
+    filter_expression (ConditionBase): Filter applied after items are read.
+    projection (list[str]): Attribute names to return. Defaults to all attributes.
+
+    Returns:
+    dict: Keyword arguments for DynamoDB.Client.query or DynamoDB.Client.scan.
+    """
+    builder = ConditionExpressionBuilder()
+    kwargs = {}
+    names = {}
+    values = {}
+
+    if key_condition is not None:
+        expression = builder.build_expression(key_condition, is_key_condition=True)
+        kwargs["KeyConditionExpression"] = expression.condition_expression
+        names.update(expression.attribute_name_placeholders)
+        values.update(expression.attribute_value_placeholders)
+
+    if filter_expression is not None:
+        expression = builder.build_expression(filter_expression)
+        kwargs["FilterExpression"] = expression.condition_expression
+        names.update(expression.attribute_name_placeholders)
+        values.update(expression.attribute_value_placeholders)
+
+    if projection:
+        placeholders = {f"#p{i}": name for i, name in enumerate(projection)}
+        kwargs["ProjectionExpression"] = ", ".join(placeholders)
+        names.update(placeholders)
+
+    if names:
+        kwargs["ExpressionAttributeNames"] = names
+    if values:
+        kwargs["ExpressionAttributeValues"] = {
+            placeholder: _serializer.serialize(value)
+            for placeholder, value in values.items()
+        }
+
+    return kwargs
+
+
+def serialize_value(value) -> dict:
+    """
+    Converts a Python value to a DynamoDB attribute value. Floats, which boto3 does
+    not accept, are converted to Decimal.
+    """
+    return _serializer.serialize(json.loads(json.dumps(value), parse_float=Decimal))
+
+
+def deserialize_item(item: dict) -> dict:
+    return {name: _deserializer.deserialize(value) for name, value in item.items()}
+
+
+async def query_items(
+    table_name: str,
+    key_condition: ConditionBase,
+    filter_expression: ConditionBase = None,
+    projection: list[str] = None,
+    scan_index_forward: bool = True,
+    limit: int = None,
+    index_name: str = None,
+) -> AsyncGenerator[dict, None]:
+    """
+    Streams the items matching a query, following LastEvaluatedKey across pages.
+    Pages are fetched in a worker thread so the event loop is never blocked.
+
+    Parameters:
+    table_name (str): Name of the DynamoDB table to query.
+    key_condition (ConditionBase): Key condition of the query.
+    filter_expression (ConditionBase): Optional filter applied after items are read.
+    projection (list[str]): Attribute names to return. Defaults to all attributes.
+    scan_index_forward (bool): Set to False to read the sort key in descending order.
+    limit (int): Stop after this many items. Defaults to no limit.
+    index_name (str): Optional secondary index to query.
+
+    Yields:
+    dict: Items with DynamoDB types converted to Python types.
+    """
+    client = get_dynamodb_client()
+
+    kwargs = build_expression_kwargs(key_condition, filter_expression, projection)
+    kwargs["TableName"] = table_name
+    kwargs["ScanIndexForward"] = scan_index_forward
+    kwargs["ReturnConsumedCapacity"] = "TOTAL"
+    if index_name:
+        kwargs["IndexName"] = index_name
+    if limit and filter_expression is None:
+        kwargs["Limit"] = limit
+
+    consumed_capacity["queries"] += 1
+
+    remaining = limit
+    while True:
+        response = await asyncio.to_thread(client.query, **kwargs)
+        record_page(response)
+
+        for item in response["Items"]:
+            yield deserialize_item(item)
+
+            if remaining:
+                remaining -= 1
+                if remaining == 0:
+                    return
+
+        if "LastEvaluatedKey" not in response:
+            return
+
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+async def scan_items(
+    table_name: str,
+    filter_expression: ConditionBase = None,
+    projection: list[str] = None,
+    total_segments: int = DYNAMODB_SCAN_SEGMENTS,
+) -> AsyncGenerator[dict, None]:
+    """
+    Streams the items of a parallel table scan.
+
+    The table is split into total_segments segments that are scanned by at most
+    DYNAMODB_SCAN_WORKERS workers at once, each following LastEvaluatedKey until its
+    segment is exhausted. Pages are handed over through a bounded queue, so items
+    are yielded as they arrive and the table is never buffered as a whole.
+
+    Parameters:
+    table_name (str): Name of the DynamoDB table to scan.
+    filter_expression (ConditionBase): Optional filter applied after items are read.
+    projection (list[str]): Attribute names to return. Defaults to all attributes.
+    total_segments (int): Number of scan segments. Defaults to DYNAMODB_SCAN_SEGMENTS.
+
+    Yields:
+    dict: Items with DynamoDB types converted to Python types, in no particular order.
+    """
+    client = get_dynamodb_client()
+
+    kwargs = build_expression_kwargs(None, filter_expression, projection)
+    kwargs["TableName"] = table_name
+    kwargs["ReturnConsumedCapacity"] = "TOTAL"
+    kwargs["TotalSegments"] = total_segments
+
+    consumed_capacity["scans"] += 1
+
+    pages = asyncio.Queue(maxsize=total_segments)
+    semaphore = asyncio.Semaphore(DYNAMODB_SCAN_WORKERS)
+
+    async def scan_segment(segment: int):
+        try:
+            async with semaphore:
+                segment_kwargs = {**kwargs, "Segment": segment}
+                while True:
+                    response = await asyncio.to_thread(client.scan, **segment_kwargs)
+                    record_page(response)
+
+                    await pages.put(response["Items"])
+
+                    if "LastEvaluatedKey" not in response:
+                        break
+
+                    segment_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except Exception as e:
+            await pages.put(e)
+        else:
+            await pages.put(None)
+
+    tasks = [
+        asyncio.create_task(scan_segment(segment)) for segment in range(total_segments)
+    ]
+    try:
+        remaining = total_segments
+        while remaining:
+            page = await pages.get()
+
+            if page is None:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                for item in page:
+                    yield deserialize_item(item)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def record_page(response: dict):
+    consumed_capacity["pages"] += 1
+    consumed_capacity["items"] += len(response["Items"])
+    consumed_capacity["read_capacity_units"] += response.get(
+        "ConsumedCapacity", {}
+    ).get("CapacityUnits", 0)
+
+
+def record_write(response: dict):
+    consumed_capacity["writes"] += 1
+    consumed_capacity["write_capacity_units"] += response.get(
+        "ConsumedCapacity", {}
+    ).get("CapacityUnits", 0)
+
+
+def is_missing_index_error(e: Exception) -> bool:
+    """
+    Checks whether a query failed because the table has no such secondary index.
+    DynamoDB reports it as a ValidationException, DynamoDB Local and moto as a
+    ResourceNotFoundException.
+    """
+    return (
+        isinstance(e, ClientError)
+        and e.response["Error"]["Code"]
+        in ("ValidationException", "ResourceNotFoundException")
+        and "index" in e.response["Error"]["Message"].lower()
+    )
+
+
+def get_dynamodb_stats() -> dict:
+    return dict(consumed_capacity)
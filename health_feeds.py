@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable
+
+from http_client import get_http_client
+
+HEALTH_FEED_TTL = float(os.getenv("HEALTH_FEED_TTL", "60"))
+HEALTH_HISTORY_FEED_TTL = float(os.getenv("HEALTH_HISTORY_FEED_TTL", "900"))
+HEALTH_FEED_BACKGROUND_REFRESH = (
+    os.getenv("HEALTH_FEED_BACKGROUND_REFRESH", "true").lower() == "true"
+)
+
+
+class feed_cache:
+    """
+    Shared cache of a public JSON feed.
+
+    Expired entries are still served while a single background refresh revalidates
+    them with If-None-Match/If-Modified-Since. Concurrent misses wait on the same
+    download, so at most one request per feed is in flight.
+
+    Parameters:
+    url (str): URL of the JSON feed.
+    ttl (float): Seconds before a cached copy is considered stale.
+    transform (Callable): Optional function applied to the parsed JSON once per download.
+    """
+
+    def __init__(self, url: str, ttl: float, transform: Callable = None):
+        self.url = url
+        self.ttl = ttl
+        self.transform = transform
+
+        self.data = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = None
+        self.last_error = None
+        self.refresh_task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.downloads = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def age(self) -> float | None:
+        if self.fetched_at is None:
+            return None
+
+        return time.monotonic() - self.fetched_at
+
+    async def get(self):
+        """
+        Returns the parsed feed, downloading it only if nothing is cached yet.
+
+        Raises:
+        Exception: The download or parse error if no copy could be fetched.
+        """
+        if self.data is not None:
+            if self.age() < self.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self.schedule_refresh()
+
+            return self.data
+
+        self.misses += 1
+        await asyncio.shield(self.schedule_refresh())
+
+        if self.data is None:
+            raise self.last_error
+
+        return self.data
+
+    def schedule_refresh(self) -> asyncio.Task:
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self.refresh())
+
+        return self.refresh_task
+
+    async def refresh(self):
+        headers = {}
+        if self.data is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+        try:
+            response = await get_http_client().get(self.url, headers=headers)
+
+            if response.status_code == 304:
+                self.not_modified += 1
+            else:
+                response.raise_for_status()
+                self.data = await asyncio.to_thread(self.parse, response.content)
+                self.etag = response.headers.get("ETag")
+                self.last_modified = response.headers.get("Last-Modified")
+                self.downloads += 1
+
+            self.fetched_at = time.monotonic()
+        except Exception as e:
+            print(e)
+
+            self.errors += 1
+            self.last_error = e
+
+    def parse(self, content: bytes):
+        data = json.loads(content)
+        if self.transform is not None:
+            data = self.transform(data)
+
+        return data
+
+    async def keep_fresh(self):
+        while True:
+            await self.schedule_refresh()
+            await asyncio.sleep(self.ttl)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "downloads": self.downloads,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+            "age_seconds": self.age(),
+            "stale": self.fetched_at is None or self.age() >= self.ttl,
+        }
+
+
+class health_history_index:
+    """
+    AWS health history feed indexed for time-range lookups.
+
+    Events are grouped by feed key (service and region, e.g. "ec2-us-east-1") and
+    sorted by their unix date within each group. An offset table maps every key to
+    its slice of the shared date array, so a time range is two bisections per key.
+
+    Parameters:
+    history_data (dict): The parsed historyevents.json feed.
+    """
+
+    def __init__(self, history_data: dict):
+        self.dates = array("q")
+        self.events = []
+        self.offsets = {}
+
+        for key in sorted(history_data):
+            events = sorted(history_data[key], key=lambda event: int(event["date"]))
+
+            start = len(self.events)
+            self.dates.extend(int(event["date"]) for event in events)
+            self.events.extend(events)
+            self.offsets[key] = (start, len(self.events))
+
+    def query(
+        self, start: float, end: float, region: str = None, service: str = None
+    ) -> dict[str, list[dict]]:
+        """
+        Finds the events dated within a time range.
+
+        Parameters:
+        start (float): Lower bound as a unix timestamp, inclusive.
+        end (float): Upper bound as a unix timestamp, inclusive.
+        region (str): Only keep events whose key or region matches, e.g. "us-east-1".
+        service (str): Only keep events whose key or service matches, e.g. "ec2".
+
+        Returns:
+        dict[str, list[dict]]: Matching events keyed by feed key, oldest first. The
+        events are the indexed objects and must not be modified.
+        """
+        region = region.lower() if region else None
+        service = service.lower() if service else None
+
+        results = {}
+        for key, (lower, upper) in self.offsets.items():
+            i = bisect_left(self.dates, start, lower, upper)
+            j = bisect_right(self.dates, end, lower, upper)
+
+            events = [
+                event
+                for event in self.events[i:j]
+                if self.matches(key, event, region, service)
+            ]
+            if events:
+                results[key] = events
+
+        return results
+
+    @staticmethod
+    def matches(key: str, event: dict, region: str, service: str) -> bool:
+        key = key.lower()
+
+        if region and region not in key:
+            if region not in str(event.get("region_name", "")).lower():
+                return False
+
+        if service and not key.startswith(service):
+            names = (event.get("service", ""), event.get("service_name", ""))
+            if not any(service in str(name).lower() for name in names):
+                return False
+
+        return True
+
+
+current_events_feed = feed_cache(
+    "https://health.aws.amazon.com/public/currentevents", HEALTH_FEED_TTL
+)
+announcement_feed = feed_cache(
+    "https://health.aws.amazon.com/public/announcement", HEALTH_FEED_TTL
+)
+history_events_feed = feed_cache(
+    "https://history-events-us-west-2-prod.s3.amazonaws.com/historyevents.json",
+    HEALTH_HISTORY_FEED_TTL,
+    transform=health_history_index,
+)
+
+HEALTH_FEEDS = {
+    "currentevents": current_events_feed,
+    "announcement": announcement_feed,
+    "historyevents": history_events_feed,
+}
+
+_refresher_tasks: list[asyncio.Task] = []
+
+
+def start_feed_refresher():
+    """
+    Starts one background task per feed that keeps it fresh, so tool calls are
+    served from memory instead of waiting on a download.
+    """
+    if HEALTH_FEED_BACKGROUND_REFRESH and not _refresher_tasks:
+        for feed in HEALTH_FEEDS.values():
+            _refresher_tasks.append(asyncio.create_task(feed.keep_fresh()))
+
+
+async def stop_feed_refresher():
+    for task in _refresher_tasks:
+        task.cancel()
+
+    await asyncio.gather(*_refresher_tasks, return_exceptions=True)
+    _refresher_tasks.clear()
+
+
+def get_feed_stats() -> dict:
+    return {name: feed.stats() for name, feed in HEALTH_FEEDS.items()}
@@ -0,0 +1,427 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+from boto3.dynamodb.conditions import Key
+
+from dynamodb_client import is_missing_index_error, query_items, scan_items
+from ping_queries import *
+from timezone import iso_8601_to_unix
+
+if TYPE_CHECKING:
+    import numpy as np
+
+LATENCY_MATRIX_ENABLED = os.getenv("LATENCY_MATRIX_ENABLED", "false").lower() == "true"
+LATENCY_MATRIX_TABLES = [
+    table_name.strip()
+    for table_name in os.getenv("LATENCY_MATRIX_TABLES", "PingDB").split(",")
+    if table_name.strip()
+]
+LATENCY_MATRIX_REFRESH_INTERVAL = float(
+    os.getenv("LATENCY_MATRIX_REFRESH_INTERVAL", "60")
+)
+LATENCY_MATRIX_REBUILD_INTERVAL = float(
+    os.getenv("LATENCY_MATRIX_REBUILD_INTERVAL", "3600")
+)
+LATENCY_MATRIX_MAX_STALENESS = float(os.getenv("LATENCY_MATRIX_MAX_STALENESS", "300"))
+LATENCY_MATRIX_REFRESH_OVERLAP = float(
+    os.getenv("LATENCY_MATRIX_REFRESH_OVERLAP", "300")
+)
+LATENCY_MATRIX_DISCOVERY_INTERVAL = float(
+    os.getenv("LATENCY_MATRIX_DISCOVERY_INTERVAL", "240")
+)
+
+
+def shift_timestamp(timestamp: str, seconds: float) -> str:
+    return (datetime.fromisoformat(timestamp) + timedelta(seconds=seconds)).isoformat()
+
+
+class latency_matrix:
+    """
+    Latest ping of every source/destination pair of a ping table, held in NumPy
+    arrays with one row per source region and one column per destination. NumPy
+    is only imported once a matrix is created, so workers with the matrices
+    disabled never load it.
+
+    The matrix is built with a parallel scan and then refreshed incrementally from
+    the destination index. Each destination column keeps its own watermark, the
+    newest timestamp read for it, and a refresh re-reads the last
+    LATENCY_MATRIX_REFRESH_OVERLAP seconds before it, so pings written late or
+    stamped with an already seen timestamp are not skipped. Destinations that
+    appear after the build are discovered every LATENCY_MATRIX_DISCOVERY_INTERVAL
+    by walking the sort keys of each source between the known destinations.
+
+    The matrix needs the index: without it every refresh would be a full table
+    scan, so the matrix disables itself instead and queries fall back to
+    DynamoDB.
+
+    Parameters:
+    table_name (str): Name of the DynamoDB ping table.
+    """
+
+    def __init__(self, table_name: str):
+        import numpy as np
+
+        self.table_name = table_name
+
+        self.sources = {}
+        self.destinations = {}
+        self.latency = np.full((0, 0), np.nan)
+        self.epochs = np.full((0, 0), np.nan)
+        self.items = np.empty((0, 0), dtype=object)
+
+        self.watermarks: dict[str, str] = {}
+        self.refreshed_at = None
+        self.rebuilt_at = None
+        self.discovered_at = None
+        self.refresh_task: asyncio.Task | None = None
+
+        self.disabled = False
+
+        self.hits = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    def cell(self, source_region: str, destination: str) -> tuple[int, int]:
+        if source_region not in self.sources:
+            self.sources[source_region] = len(self.sources)
+        if destination not in self.destinations:
+            self.destinations[destination] = len(self.destinations)
+
+        i = self.sources[source_region]
+        j = self.destinations[destination]
+
+        rows, columns = self.latency.shape
+        if i >= rows or j >= columns:
+            shape = (max(rows, i + 1) * 2, max(columns, j + 1) * 2)
+            self.latency = self.grow(self.latency, shape, float("nan"))
+            self.epochs = self.grow(self.epochs, shape, float("nan"))
+            self.items = self.grow(self.items, shape, None)
+
+        return i, j
+
+    @staticmethod
+    def grow(array: "np.ndarray", shape: tuple[int, int], fill) -> "np.ndarray":
+        import numpy as np
+
+        grown = np.full(shape, fill, dtype=array.dtype)
+        grown[: array.shape[0], : array.shape[1]] = array
+
+        return grown
+
+    def update(self, item: dict):
+        i, j = self.cell(item["origin"], item["destination"])
+
+        current = self.items[i, j]
+        if current is None or item["timestamp"] > current["timestamp"]:
+            self.items[i, j] = item
+            self.latency[i, j] = float(item["latency"])
+            self.epochs[i, j] = iso_8601_to_unix(item["timestamp"])
+
+        watermark = self.watermarks.get(item["destination"])
+        if watermark is None or item["timestamp"] > watermark:
+            self.watermarks[item["destination"]] = item["timestamp"]
+
+    async def rebuild(self):
+        rebuilt = latency_matrix(self.table_name)
+        async for item in scan_items(self.table_name, projection=PING_ATTRIBUTES):
+            rebuilt.update(item)
+
+        self.sources = rebuilt.sources
+        self.destinations = rebuilt.destinations
+        self.latency = rebuilt.latency
+        self.epochs = rebuilt.epochs
+        self.items = rebuilt.items
+        self.watermarks = rebuilt.watermarks
+        self.rebuilt_at = time.time()
+        self.discovered_at = self.rebuilt_at
+
+    async def refresh_destination(self, destination: str):
+        lower = shift_timestamp(
+            self.watermarks[destination], -LATENCY_MATRIX_REFRESH_OVERLAP
+        )
+        async for item in query_items(
+            self.table_name,
+            Key("destination").eq(destination) & Key("timestamp").gte(lower),
+            projection=PING_ATTRIBUTES,
+            index_name=PING_DESTINATION_INDEX,
+        ):
+            self.update(item)
+
+    async def discover_from_source(self, source_region: str):
+        """
+        Finds the destinations of a source that are missing from the matrix.
+
+        Every gap between the known destinations in the "destination#timestamp"
+        sort key is read backwards with a limit of one item, which returns the
+        latest ping of the last unknown destination in the gap, if any. The gap is
+        then narrowed to end before that destination and read again, so each query
+        reads a single item.
+        """
+        known = sorted(self.destinations)
+        gaps = zip([None] + [d + "$" for d in known], [d + "#" for d in known] + [None])
+
+        for start, end in gaps:
+            while True:
+                key_condition = Key("origin").eq(source_region)
+                if start and end:
+                    key_condition &= Key("destination#timestamp").between(start, end)
+                elif start:
+                    key_condition &= Key("destination#timestamp").gt(start)
+                elif end:
+                    key_condition &= Key("destination#timestamp").lt(end)
+
+                items = [
+                    item
+                    async for item in query_items(
+                        self.table_name,
+                        key_condition,
+                        projection=PING_ATTRIBUTES,
+                        scan_index_forward=False,
+                        limit=1,
+                    )
+                ]
+                if not items or items[0]["destination"] in self.destinations:
+                    break
+
+                self.update(items[0])
+                end = items[0]["destination"] + "#"
+
+    async def discover(self):
+        results = await asyncio.gather(
+            *(self.discover_from_source(source) for source in list(self.sources)),
+            return_exceptions=True,
+        )
+        errors = [e for e in results if isinstance(e, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def has_destination_index(self) -> bool:
+        """
+        Checks for the destination index with a query that reads no items.
+        """
+        if missing_destination_index(self.table_name):
+            return False
+
+        try:
+            async for _ in query_items(
+                self.table_name,
+                Key("destination").eq("$"),
+                limit=1,
+                index_name=PING_DESTINATION_INDEX,
+            ):
+                pass
+        except Exception as e:
+            if not is_missing_index_error(e):
+                raise
+
+            mark_missing_destination_index(self.table_name)
+            return False
+
+        return True
+
+    def disable(self):
+        print(
+            f"Latency matrix of {self.table_name} disabled, "
+            f"{PING_DESTINATION_INDEX} not found, see ping_destination_index.json"
+        )
+
+        self.disabled = True
+
+    async def refresh(self):
+        started_at = time.time()
+
+        try:
+            if not self.watermarks and not await self.has_destination_index():
+                self.disable()
+                return
+
+            if (
+                not self.watermarks
+                or started_at - self.rebuilt_at >= LATENCY_MATRIX_REBUILD_INTERVAL
+            ):
+                await self.rebuild()
+            else:
+                results = await asyncio.gather(
+                    *(
+                        self.refresh_destination(destination)
+                        for destination in list(self.destinations)
+                    ),
+                    return_exceptions=True,
+                )
+                errors = [e for e in results if isinstance(e, Exception)]
+                if errors:
+                    if not is_missing_index_error(errors[0]):
+                        raise errors[0]
+
+                    mark_missing_destination_index(self.table_name)
+                    self.disable()
+                    return
+                elif (
+                    started_at - self.discovered_at >= LATENCY_MATRIX_DISCOVERY_INTERVAL
+                ):
+                    await self.discover()
+                    self.discovered_at = started_at
+
+            self.refreshed_at = started_at
+        except Exception as e:
+            print(e)
+
+            self.errors += 1
+
+    def schedule_refresh(self) -> asyncio.Task:
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self.refresh())
+
+        return self.refresh_task
+
+    async def keep_fresh(self):
+        while True:
+            await self.schedule_refresh()
+            if self.disabled:
+                return
+
+            await asyncio.sleep(LATENCY_MATRIX_REFRESH_INTERVAL)
+
+    def covers(self, time_lower_bound: str, time_upper_bound: str) -> bool:
+        """
+        Checks whether the matrix can answer a query over a time range. The range
+        must reach the last refresh, and both the last refresh and the last
+        discovery of new destinations must be within the staleness bound.
+        """
+        if self.disabled or self.refreshed_at is None or self.discovered_at is None:
+            return False
+
+        now = time.time()
+        if (
+            now - self.refreshed_at > LATENCY_MATRIX_MAX_STALENESS
+            or now - self.discovered_at > LATENCY_MATRIX_MAX_STALENESS
+        ):
+            return False
+
+        try:
+            iso_8601_to_unix(time_lower_bound)
+            return iso_8601_to_unix(time_upper_bound) >= self.refreshed_at
+        except ValueError:
+            return False
+
+    def nth(
+        self,
+        latency: "np.ndarray",
+        epochs: "np.ndarray",
+        items: "np.ndarray",
+        n: int,
+        highest: bool,
+        time_lower_bound: str,
+    ) -> tuple[dict | None, int]:
+        """
+        Selects the nth lowest or highest latency of one row or column.
+
+        Returns:
+        tuple[dict | None, int]: The selected ping item, or None if fewer than n pings
+        are in the time range, and the number of pings in the time range.
+        """
+        import numpy as np
+
+        candidates = np.flatnonzero(epochs >= iso_8601_to_unix(time_lower_bound))
+        if len(candidates) < n or n < 1:
+            return None, len(candidates)
+
+        k = len(candidates) - n if highest else n - 1
+        selected = np.argpartition(latency[candidates], k)[k]
+
+        return items[candidates[selected]], len(candidates)
+
+    def nth_from_source(
+        self, source_region: str, n: int, highest: bool, time_lower_bound: str
+    ) -> tuple[dict | None, int]:
+        if source_region not in self.sources:
+            return None, 0
+
+        i = self.sources[source_region]
+        columns = len(self.destinations)
+
+        return self.nth(
+            self.latency[i, :columns],
+            self.epochs[i, :columns],
+            self.items[i, :columns],
+            n,
+            highest,
+            time_lower_bound,
+        )
+
+    def nth_to_destination(
+        self, destination: str, n: int, highest: bool, time_lower_bound: str
+    ) -> tuple[dict | None, int]:
+        if destination not in self.destinations:
+            return None, 0
+
+        j = self.destinations[destination]
+        rows = len(self.sources)
+
+        return self.nth(
+            self.latency[:rows, j],
+            self.epochs[:rows, j],
+            self.items[:rows, j],
+            n,
+            highest,
+            time_lower_bound,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "sources": len(self.sources),
+            "destinations": len(self.destinations),
+            "age_seconds": (
+                time.time() - self.refreshed_at if self.refreshed_at else None
+            ),
+            "disabled": self.disabled,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "errors": self.errors,
+        }
+
+
+_matrices: dict[str, latency_matrix] = {}
+_refresher_tasks: list[asyncio.Task] = []
+
+
+def get_latency_matrix(table_name: str) -> latency_matrix | None:
+    """
+    Returns the latency matrix of a ping table, or None if the table is not listed
+    in LATENCY_MATRIX_TABLES, the matrices are disabled, or the table has no
+    destination index.
+    """
+    matrix = _matrices.get(table_name)
+    if matrix is None or matrix.disabled:
+        return None
+
+    return matrix
+
+
+def start_latency_matrices():
+    """
+    Creates the matrices of LATENCY_MATRIX_TABLES and starts their background
+    refreshers.
+    """
+    if LATENCY_MATRIX_ENABLED and not _matrices:
+        for table_name in LATENCY_MATRIX_TABLES:
+            _matrices[table_name] = latency_matrix(table_name)
+            _refresher_tasks.append(
+                asyncio.create_task(_matrices[table_name].keep_fresh())
+            )
+
+
+async def stop_latency_matrices():
+    for task in _refresher_tasks:
+        task.cancel()
+
+    await asyncio.gather(*_refresher_tasks, return_exceptions=True)
+    _refresher_tasks.clear()
+    _matrices.clear()
+
+
+def get_latency_matrix_stats() -> dict:
+    return {table_name: matrix.stats() for table_name, matrix in _matrices.items()}
@@ -1,27 +1,32 @@
-import ast
+import asyncio
+import json
 import os
-from functools import partial
 from typing import AsyncGenerator
 
-import boto3
-from fastapi import FastAPI, HTTPException, Response, Security
+from fastapi import Depends, FastAPI, HTTPException, Response, Security
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security.api_key import APIKeyHeader
-from langchain_aws import ChatBedrock
-from langchain_community.chat_message_histories import DynamoDBChatMessageHistory
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.messages import HumanMessage
+from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
 
+from admission import chat_admission
+from chat_history import apply_history_policy, history_entries, sessions
+from dynamodb_client import get_dynamodb_stats
+from health_feeds import get_feed_stats
+from latency_matrix import get_latency_matrix_stats
 from prompts import *
 from pydantic_models import *
+from runtime import *
+from stream_framing import CHAT_STREAM_FORMAT, STREAM_MEDIA_TYPES, frame_stream
 from timezone import convert_to_utc
-from tools import *
+from titles import prefix_digest, title_prefix, titles
+from tool_calls import tool_call_dispatcher, tool_results
+from url_content import url_contents
+from web_search import search_results
 
-TABLE_NAME = "chat_history"
-
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,144 +47,97 @@ def get_api_key(api_key: str = Security(api_key_header)):
 
 
 @app.post("/chat", dependencies=[Security(get_api_key)])
-async def chat_api(chat_request: chat_request_model) -> StreamingResponse:
-    llm = ChatBedrock(streaming=True, model_id=os.getenv("BEDROCK_MODEL_ID"))
-    llm = llm.bind_tools(
-        [
-            get_available_services,
-            get_aws_health,
-            get_aws_health_history,
-            get_nth_ping_given_destination,
-            get_nth_ping_given_source,
-            get_pings,
-            search_duckduckgo,
-            url_loader,
-        ]
-    )
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage(SYSTEM_PROMPT),
-            MessagesPlaceholder(variable_name="messages"),
-        ]
-    )
-
-    def init_history(session_id: str) -> DynamoDBChatMessageHistory:
-        try:
-            return DynamoDBChatMessageHistory(
-                table_name=TABLE_NAME, session_id=session_id
-            )
-        except Exception as e:
-            print(e)
-
-            raise
-
-    chain = RunnableWithMessageHistory(prompt_template | llm, init_history)
-
-    inference = partial(
-        chain.astream,
-        config={"configurable": {"session_id": chat_request.session_id}},
-    )
-
-    async def get_response() -> AsyncGenerator[str, None]:
+async def chat_api(
+    chat_request: chat_request_model,
+    runtime: chatbot_runtime = Depends(get_runtime),
+) -> StreamingResponse:
+    ticket = await chat_admission.admit(chat_request.session_id)
+    session_history = runtime.init_history(chat_request.session_id)
+
+    async def get_response() -> AsyncGenerator[dict, None]:
         try:
             time_stamp = MESSAGE_TIME_STAMP.format(
                 chat_request.time, await convert_to_utc(chat_request.time)
             )
             message = [HumanMessage(chat_request.input + time_stamp)]
 
-            yield "<|message_received|>"
+            yield {"type": "message_received"}
+
+            context = apply_history_policy(await session_history.aget_messages())
             while True:
                 gathered = None
-                async for chunk in inference(input={"messages": message}):
-                    if gathered is None:
-                        gathered = chunk
+                dispatcher = tool_call_dispatcher(runtime.tools)
+                try:
+                    async for chunk in runtime.chain.astream(
+                        {"messages": context + message}
+                    ):
+                        if gathered is None:
+                            gathered = chunk
+                        else:
+                            gathered = gathered + chunk
+
+                        if chunk.tool_call_chunks:
+                            dispatcher.feed(chunk.tool_call_chunks)
+
+                        if chunk.content:
+                            if "text" in chunk.content[0]:
+                                yield {
+                                    "type": "text",
+                                    "text": chunk.content[0]["text"],
+                                }
+
+                    session_history.add_messages(message + [gathered])
+                    context += message + [gathered]
+
+                    if gathered.tool_call_chunks:
+                        tool_calls = [
+                            {"name": call.name, "id": call.tool_call_id}
+                            for call in dispatcher.calls.values()
+                        ]
+                        yield {"type": "tool_start", "tool_calls": tool_calls}
+
+                        message = await dispatcher.results()
+
+                        yield {"type": "tool_end", "tool_calls": tool_calls}
                     else:
-                        gathered = gathered + chunk
-
-                    if chunk.content:
-                        if "text" in chunk.content[0]:
-                            yield chunk.content[0]["text"]
-
-                if gathered.tool_call_chunks:
-                    yield "<|tool_call|>"
-
-                    message = []
-                    for tool_call in gathered.tool_call_chunks:
-                        tools = {
-                            "get_available_services": get_available_services,
-                            "get_aws_health": get_aws_health,
-                            "get_aws_health_history": get_aws_health_history,
-                            "get_nth_ping_given_destination": get_nth_ping_given_destination,
-                            "get_nth_ping_given_source": get_nth_ping_given_source,
-                            "get_pings": get_pings,
-                            "search_duckduckgo": search_duckduckgo,
-                            "url_loader": url_loader,
-                        }
-                        selected_tool = tools[tool_call["name"]]
-                        tool_args = ast.literal_eval(
-                            tool_call["args"]
-                            .replace("true", "True")
-                            .replace("false", "False")
-                        )
-                        tool_output = await selected_tool.ainvoke(tool_args)
-
-                        message.append(
-                            ToolMessage(tool_output, tool_call_id=tool_call["id"])
-                        )
-                else:
-                    break
-        except Exception as e:
-            print(e)
-
-            dynamodb = boto3.resource("dynamodb")
-            table = dynamodb.Table(TABLE_NAME)
-
-            try:
-                response = table.get_item(Key={"SessionId": chat_request.session_id})
+                        break
+                finally:
+                    dispatcher.cancel()
 
-                if "Item" in response:
-                    history = response["Item"].get("history", [])
+            await session_history.acommit()
 
-                    for i in range(len(history) - 1, -1, -1):
-                        if history[i]["M"]["type"]["S"] == "human":
-                            history = history[:i]
-                            break
+            yield {"type": "done"}
+        except Exception as e:
+            print(e)
 
-                    table.update_item(
-                        Key={"SessionId": chat_request.session_id},
-                        UpdateExpression="set History = :h",
-                        ExpressionAttributeValues={":h": history},
-                    )
-            except Exception as e:
-                print(e)
+            session_history.discard()
 
-                pass
+            yield {"type": "error"}
+        finally:
+            ticket.release()
 
-            yield "<|generation_error|>"
+    stream_format = chat_request.stream_format or CHAT_STREAM_FORMAT
 
     return StreamingResponse(
-        get_response(),
-        media_type="text/plain",
+        frame_stream(get_response(), stream_format),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release),
     )
 
 
 @app.post("/get-history", dependencies=[Security(get_api_key)])
-async def get_history_api(history_request: history_request_model):
+async def get_history_api(
+    history_request: history_request_model,
+    response: Response,
+    runtime: chatbot_runtime = Depends(get_runtime),
+):
     try:
-        dynamodb = boto3.resource("dynamodb")
-        table = dynamodb.Table(TABLE_NAME)
-
-        history = table.get_item(Key={"SessionId": history_request.session_id})
-
-        if "Item" in history:
-            filtered_history = [
-                {"type": entry["type"], "content": entry["data"]["content"]}
-                for entry in history["Item"]["History"]
-            ]
-            return filtered_history
-        else:
-            raise Exception(f"Session history {history_request.session_id} not found")
+        session_history = runtime.init_history(history_request.session_id)
+        history = await session_history.aget_messages()
 
+        if not history:
+            raise Exception(f"Session history {history_request.session_id} not found")
     except Exception as e:
         print(e)
 
@@ -188,18 +146,44 @@ async def get_history_api(history_request: history_request_model):
             detail=str(e),
         )
 
+    total, filtered_history = history_entries(
+        history,
+        history_request.offset,
+        history_request.limit,
+        history_request.newest_first,
+        history_request.text_only,
+    )
+    response.headers["X-Total-Count"] = str(total)
+
+    if history_request.stream:
+
+        async def stream_history() -> AsyncGenerator[str, None]:
+            for entry in filtered_history:
+                yield json.dumps(jsonable_encoder(entry)) + "\n"
+
+        return StreamingResponse(
+            stream_history(),
+            media_type="application/x-ndjson",
+            headers={"X-Total-Count": str(total)},
+        )
+
+    return list(filtered_history)
+
 
 @app.post("/delete-history", dependencies=[Security(get_api_key)])
-async def delete_history_api(history_request: history_request_model):
+async def delete_history_api(
+    history_request: history_request_model,
+    runtime: chatbot_runtime = Depends(get_runtime),
+):
     try:
-        dynamodb = boto3.resource("dynamodb")
-        table = dynamodb.Table(TABLE_NAME)
+        session_history = runtime.init_history(history_request.session_id)
 
-        table.delete_item(Key={"SessionId": history_request.session_id})
+        await session_history.aclear()
+        titles.invalidate(history_request.session_id)
 
-        response = table.get_item(Key={"SessionId": history_request.session_id})
+        await asyncio.to_thread(session_history.load, False)
 
-        if "Item" in response:
+        if session_history.messages:
             raise Exception(
                 f"Error deleting session history {history_request.session_id}"
             )
@@ -215,33 +199,67 @@ async def delete_history_api(history_request: history_request_model):
 
 
 @app.post("/generate-title", dependencies=[Security(get_api_key)])
-async def generate_title_api(history_request: history_request_model):
+async def generate_title_api(
+    history_request: history_request_model,
+    runtime: chatbot_runtime = Depends(get_runtime),
+):
     try:
-        llm = ChatBedrock(model_id=os.getenv("BEDROCK_MODEL_ID"))
-        llm = llm.with_structured_output(title_response_model)
-
-        prompt_template = ChatPromptTemplate.from_messages(
-            [
-                SystemMessage(GENERATE_TITLE_SYSTEM_PROMPT),
-                MessagesPlaceholder(variable_name="history"),
-            ]
-        )
+        session_history = runtime.init_history(history_request.session_id)
+        history = await session_history.aget_messages()
 
-        chain = prompt_template | llm
+        if not history:
+            raise Exception(f"Session history {history_request.session_id} not found")
 
-        history = str(await get_history_api(history_request))
+        prefix = title_prefix(history)
+        digest = prefix_digest(prefix)
 
-        response: title_response_model = chain.invoke(
-            {"history": [HumanMessage(history)]}
-        )
+        title = titles.get(history_request.session_id, digest)
+        if title is None:
+            response: title_response_model = await runtime.title_chain.ainvoke(
+                {"history": [HumanMessage(str(prefix))]}
+            )
+            title = response.title
 
-        return response.title
+            titles.put(history_request.session_id, digest, title)
+
+        return title
     except Exception as e:
         print(e)
 
         return "New chat"
 
 
+@app.post("/reload-runtime", dependencies=[Security(get_api_key)])
+async def reload_runtime_api(reload_request: reload_request_model):
+    try:
+        reload_runtime(reload_request.model_id)
+
+        return Response(status_code=204)
+    except Exception as e:
+        print(e)
+
+        raise HTTPException(
+            status_code=500,
+            detail=str(e),
+        )
+
+
+@app.get("/metrics", dependencies=[Security(get_api_key)])
+async def metrics_api():
+    return {
+        "admission": chat_admission.stats(),
+        "sessions": sessions.stats(),
+        "titles": titles.stats(),
+        "url_loader": url_contents.stats(),
+        "search": search_results.stats(),
+        "tool_cache": tool_results.stats(),
+        "process": get_process_stats(),
+        "health_feeds": get_feed_stats(),
+        "dynamodb": get_dynamodb_stats(),
+        "latency_matrices": get_latency_matrix_stats(),
+    }
+
+
 @app.get("/")
 async def health_check():
     return Response(status_code=200)
@@ -0,0 +1,130 @@
+import os
+from typing import AsyncGenerator, AsyncIterator
+
+from boto3.dynamodb.conditions import Attr, ConditionBase, Key
+
+from dynamodb_client import is_missing_index_error, query_items, scan_items
+
+PING_ATTRIBUTES = ["origin", "destination", "timestamp", "latency"]
+PING_BATCH_MAX_PAIRS = int(os.getenv("PING_BATCH_MAX_PAIRS", "20"))
+PING_DESTINATION_INDEX = os.getenv(
+    "PING_DESTINATION_INDEX", "destination-timestamp-index"
+)
+
+_tables_without_destination_index = set()
+
+
+def missing_destination_index(table_name: str) -> bool:
+    """
+    Checks whether a table is known to have no PING_DESTINATION_INDEX.
+    """
+    return table_name in _tables_without_destination_index
+
+
+def mark_missing_destination_index(table_name: str):
+    """
+    Remembers that a table has no PING_DESTINATION_INDEX, so later reads of the
+    pings to a destination scan it instead of querying the index.
+    """
+    _tables_without_destination_index.add(table_name)
+
+
+def ping_key_condition(
+    source_region: str,
+    destination: str,
+    time_lower_bound: str = None,
+    time_upper_bound: str = None,
+) -> ConditionBase:
+    """
+    Builds the key condition selecting pings from a source to a destination,
+    bounding the "destination#timestamp" sort key so DynamoDB only reads items
+    inside the time range.
+
+    Parameters:
+    source_region (str): AWS region code for the source region.
+    destination (str): AWS region code or city name for the destination.
+    time_lower_bound (str): Optional ISO 8601 formatted string. UTC.
+    time_upper_bound (str): Optional ISO 8601 formatted string. UTC.
+
+    Returns:
+    ConditionBase: The key condition for a query on the ping table.
+    """
+    # "$" sorts right after "#", so it closes the range of this destination's keys.
+    lower = destination + "#" + (time_lower_bound or "")
+    upper = destination + ("#" + time_upper_bound if time_upper_bound else "$")
+
+    return Key("origin").eq(source_region) & Key("destination#timestamp").between(
+        lower, upper
+    )
+
+
+async def latest_pings_by(key: str, items: AsyncIterator[dict]) -> dict[str, dict]:
+    """
+    Reduces a stream of ping items to the latest item per value of key.
+
+    Parameters:
+    key (str): Attribute to group by, e.g. "origin" or "destination".
+    items (AsyncIterator[dict]): Ping items, in any order.
+
+    Returns:
+    dict[str, dict]: The item with the greatest timestamp for each value of key.
+    """
+    latest_pings = {}
+    async for item in items:
+        current = latest_pings.get(item[key])
+        if current is None or item["timestamp"] > current["timestamp"]:
+            latest_pings[item[key]] = item
+
+    return latest_pings
+
+
+async def ping_items_to_destination(
+    table_name: str,
+    destination: str,
+    time_lower_bound: str,
+    time_upper_bound: str,
+) -> AsyncGenerator[dict, None]:
+    """
+    Streams the pings to a destination within a time range.
+
+    Queries the PING_DESTINATION_INDEX global secondary index (partition key
+    "destination", sort key "timestamp", see ping_destination_index.json). Tables
+    without the index are remembered and scanned instead.
+
+    Parameters:
+    table_name (str): Name of the DynamoDB table to query.
+    destination (str): AWS region code or city name for the destination.
+    time_lower_bound (str): ISO 8601 formatted string. UTC.
+    time_upper_bound (str): ISO 8601 formatted string. UTC.
+
+    Yields:
+    dict: Ping items with the PING_ATTRIBUTES only.
+    """
+    if not missing_destination_index(table_name):
+        yielded = False
+        try:
+            async for item in query_items(
+                table_name,
+                Key("destination").eq(destination)
+                & Key("timestamp").between(time_lower_bound, time_upper_bound),
+                projection=PING_ATTRIBUTES,
+                index_name=PING_DESTINATION_INDEX,
+            ):
+                yielded = True
+                yield item
+
+            return
+        except Exception as e:
+            if yielded or not is_missing_index_error(e):
+                raise
+
+            print(e)
+            mark_missing_destination_index(table_name)
+
+    async for item in scan_items(
+        table_name,
+        Attr("destination").eq(destination)
+        & Attr("timestamp").between(time_lower_bound, time_upper_bound),
+        projection=PING_ATTRIBUTES,
+    ):
+        yield item
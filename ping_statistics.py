@@ -0,0 +1,85 @@
+import os
+from array import array
+from typing import TYPE_CHECKING, AsyncIterator
+
+from timezone import iso_8601_to_unix
+
+if TYPE_CHECKING:
+    import numpy as np
+
+PERCENTILES = [50, 95, 99]
+PING_STATISTICS_MAX_BUCKETS = int(os.getenv("PING_STATISTICS_MAX_BUCKETS", "200"))
+
+
+async def collect_pings(
+    items: AsyncIterator[dict],
+) -> tuple["np.ndarray", "np.ndarray"]:
+    """
+    Packs a stream of ping items into arrays without keeping the items themselves.
+    NumPy is imported on the first call, not when the tools are loaded.
+
+    Returns:
+    tuple[np.ndarray, np.ndarray]: Unix timestamps and latencies of the pings.
+    """
+    import numpy as np
+
+    epochs = array("d")
+    latencies = array("d")
+    async for item in items:
+        epochs.append(iso_8601_to_unix(item["timestamp"]))
+        latencies.append(float(item["latency"]))
+
+    return np.asarray(epochs, dtype=np.float64), np.asarray(latencies, dtype=np.float64)
+
+
+def summarize(latencies: "np.ndarray") -> dict:
+    import numpy as np
+
+    p50, p95, p99 = np.percentile(latencies, PERCENTILES)
+
+    return {
+        "count": len(latencies),
+        "min": latencies.min(),
+        "mean": latencies.mean(),
+        "p50": p50,
+        "p95": p95,
+        "p99": p99,
+        "max": latencies.max(),
+    }
+
+
+def bucket_statistics(
+    epochs: "np.ndarray", latencies: "np.ndarray", start: float, interval: float
+) -> list[tuple[float, dict]]:
+    """
+    Summarizes the latencies of each fixed-length time bucket.
+
+    Parameters:
+    epochs (np.ndarray): Unix timestamps of the pings.
+    latencies (np.ndarray): Latencies of the pings.
+    start (float): Unix timestamp the first bucket starts at.
+    interval (float): Bucket length in seconds.
+
+    Returns:
+    list[tuple[float, dict]]: Start of every non-empty bucket and its summary.
+    """
+    import numpy as np
+
+    buckets = np.floor((epochs - start) / interval).astype(np.int64)
+    order = np.argsort(buckets, kind="stable")
+    buckets = buckets[order]
+    latencies = latencies[order]
+
+    bucket_ids, offsets = np.unique(buckets, return_index=True)
+
+    return [
+        (start + bucket_id * interval, summarize(group))
+        for bucket_id, group in zip(bucket_ids, np.split(latencies, offsets[1:]))
+    ]
+
+
+def format_statistics(statistics: dict) -> str:
+    return ", ".join(
+        f"{name}={value}" if name == "count" else f"{name}={value:.2f}"
+        for name, value in statistics.items()
+    )
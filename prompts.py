@@ -32,6 +32,13 @@ Based on user request, select the proper table from below when calling the tool:
 - **Latest Ping Data**: Use this tool with `latest` set to `True`.
 - **Historical Ping Data**: Set `latest` to `False` and use the provided time range. If the user specifies an exact time, query a range of -6h to +6h around that time to ensure data availability. Inform the user about the closest result if you cannot find an exact one.
 - **Time Range**: Use the exact range provided by the user.
+- **Multiple Pairs**: When the user compares several source/destination pairs, call `get_pings_batch` once with all pairs instead of calling `get_pings` for each pair.
+
+### `get_ping_statistics`
+
+- **Purpose**: Summarize historical latency between a source region and a destination (min, mean, p50, p95, p99, max).
+- **Usage**: Prefer this over `get_pings` with `latest` set to `False` whenever the user asks how latency was over a period rather than for individual pings.
+- **Buckets**: Set `bucket_minutes` to break the range into intervals when the user asks about trends, e.g. 60 for hourly or 1440 for daily.
 
 ### `get_nth_ping_given_source` & `get_nth_ping_given_destination`
 
@@ -48,10 +55,12 @@ Call this to get the latest incident reports and announcements for all AWS servi
 
 - **Purpose**: Get historical incident reports within the specified time frame for all AWS services.
 - **Default Time Range**: If the user does not specify a time range, try the past 30 days.
+- **Filters**: When the user asks about a specific region or service, pass `region` (AWS region code) and/or `service` (e.g. `ec2`, `s3`, `lambda`) instead of fetching every incident.
 
 ### `get_available_services`
 
-Call this to get a list of all available AWS services in a given region and the number of available AWS services. Provide a summary by highlighting the most commonly used services and inform the user that many more are available.
+Call this to get a list of all available AWS services in one or more regions and the number of available AWS services. Provide a summary by highlighting the most commonly used services and inform the user that many more are available.
+When the user asks where a service is available, pass `service_name` instead, e.g. `bedrock`.
 
 ### `search_duckduckgo` & `url_loader`
 
@@ -62,7 +71,7 @@ Use `search_duckduckgo` when:
 
 If the initial results are unsatisfactory, search more than once to refine the query. DuckDuckGo has strict moderation, please also enforce this on your side when talking to the user. For citing quotes, use the hyperlink format in Markdown standard.
 
-Based on the snippet retrieved from each search result, use `url_loader` to obtain the complete content of one or more relevant results. Select those that will answer user's question and give insight.
+Based on the snippet retrieved from each search result, use `url_loader` to obtain the complete content of one or more relevant results. Select those that will answer user's question and give insight. Pass what you are looking for as `query` so long pages are cut to the most relevant passages.
 
 `url_loader` may also be use if user has provided you a url, but make sure that you only response if the content is AWS or Amazon services related.
 
@@ -87,6 +96,15 @@ Message sent at:
 - UTC time: {}
 """
 
+HISTORY_SUMMARY = """
+Summary of the earlier part of this conversation, oldest first:
+{}
+"""
+
+HISTORY_SUMMARY_ACKNOWLEDGEMENT = "Understood, I will keep the earlier conversation in mind."
+
+TOOL_RESULT_DIGEST = "{}... [truncated, {} characters in total, call the tool again if the full result is needed]"
+
 PING_NOT_RECORDED_ERROR = {
     "default": "No ping data recorded between {} and {}.",
     "between": "No ping data recorded between {} and {} from {} to {}.",
@@ -95,8 +113,30 @@ PING_NOT_RECORDED_ERROR = {
     "single": "No ping data recorded for {}",
 }
 
+PING_STATISTICS = "Latency from {} to {} between {} and {}: {}"
+
+TOO_MANY_PAIRS_ERROR = "Too many pairs requested, query at most {} pairs at once."
+
+TOO_MANY_BUCKETS_ERROR = "Too many buckets requested, use a larger bucket_minutes so the time range has at most {} buckets."
+
 NOT_ENOUGH_ENTRY_ERROR = "Not enough data recorded to find the {}th highest/lowest ping, {} deduplicated entries available in the given time range."
 
 AWS_HEALTH_NO_INCIDENT = "There are no current health incidents reported by AWS."
 
-AWS_HEALTH_NO_HISTORY = "No history incident reported within the specified time frame."
\ No newline at end of file
+AWS_HEALTH_NO_HISTORY = "No history incident reported within the specified time frame."
+
+TOOL_TIMEOUT_ERROR = "The tool call {} timed out after {} seconds, try again with a narrower request."
+
+TOOL_ARGUMENTS_ERROR = "Invalid arguments for the tool call {}: {}"
+
+URL_UNSUPPORTED_CONTENT_ERROR = "Unsupported content type {}, only web pages and plain text can be loaded."
+
+URL_CONTENT_TRUNCATED = "[{} of {} passages shown, call the tool again with a different query for other parts of the page]"
+
+SERVICE_REGIONS = "{} is available in {} regions: {}"
+
+SERVICE_NOT_FOUND_ERROR = "Service {} not found, use the endpoint name of the service, e.g. ec2, s3 or bedrock."
+
+REGION_NOT_FOUND_ERROR = "Region {} not found."
+
+SERVICES_MISSING_ARGUMENTS_ERROR = "Pass region_names to list the services of those regions, or service_name to list the regions of that service."
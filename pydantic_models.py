@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -5,11 +7,21 @@ class chat_request_model(BaseModel):
     input: str
     session_id: str
     time: str
+    stream_format: Literal["text", "sse", "ndjson"] | None = None
 
 
 class history_request_model(BaseModel):
     session_id: str
+    offset: int = Field(default=0, ge=0)
+    limit: int | None = Field(default=None, ge=1)
+    newest_first: bool = False
+    text_only: bool = False
+    stream: bool = False
 
 
 class title_response_model(BaseModel):
     title: str = Field(description="Maximum 10 words.")
+
+
+class reload_request_model(BaseModel):
+    model_id: str | None = None
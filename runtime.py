@@ -0,0 +1,145 @@
+import os
+import resource
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from langchain_aws import ChatBedrock
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from chat_history import dynamodb_chat_history
+from health_feeds import start_feed_refresher, stop_feed_refresher
+from http_client import close_http_client
+from latency_matrix import start_latency_matrices, stop_latency_matrices
+from prompts import *
+from pydantic_models import *
+from tools import *
+
+TABLE_NAME = "chat_history"
+
+TOOLS = [
+    get_available_services,
+    get_aws_health,
+    get_aws_health_history,
+    get_nth_ping_given_destination,
+    get_nth_ping_given_source,
+    get_ping_statistics,
+    get_pings,
+    get_pings_batch,
+    search_duckduckgo,
+    url_loader,
+]
+
+
+class chatbot_runtime:
+    """
+    Objects shared by every request of this process: the Bedrock chains, the tool
+    registry and the prompts. DynamoDB access goes through the shared client of
+    dynamodb_client.
+
+    Parameters:
+    model_id (str): Bedrock model id used by the chat and title chains.
+    """
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+
+        self.tools = {tool.name: tool for tool in TOOLS}
+
+        llm = ChatBedrock(streaming=True, model_id=model_id)
+        llm = llm.bind_tools(list(self.tools.values()))
+        prompt_template = ChatPromptTemplate.from_messages(
+            [
+                SystemMessage(SYSTEM_PROMPT),
+                MessagesPlaceholder(variable_name="messages"),
+            ]
+        )
+        self.chain = prompt_template | llm
+
+        title_llm = ChatBedrock(model_id=model_id)
+        title_llm = title_llm.with_structured_output(title_response_model)
+        title_prompt_template = ChatPromptTemplate.from_messages(
+            [
+                SystemMessage(GENERATE_TITLE_SYSTEM_PROMPT),
+                MessagesPlaceholder(variable_name="history"),
+            ]
+        )
+        self.title_chain = title_prompt_template | title_llm
+
+    def init_history(self, session_id: str) -> dynamodb_chat_history:
+        try:
+            return dynamodb_chat_history(TABLE_NAME, session_id)
+        except Exception as e:
+            print(e)
+
+            raise
+
+
+_runtime: chatbot_runtime | None = None
+
+
+def get_runtime() -> chatbot_runtime:
+    """
+    Returns the process-wide runtime, rebuilding it if BEDROCK_MODEL_ID has changed
+    since it was built.
+    """
+    global _runtime
+
+    model_id = os.getenv("BEDROCK_MODEL_ID")
+    if _runtime is None or _runtime.model_id != model_id:
+        _runtime = chatbot_runtime(model_id)
+
+    return _runtime
+
+
+def reload_runtime(model_id: str | None = None) -> chatbot_runtime:
+    """
+    Rebuilds the process-wide runtime. Requests already in flight keep the runtime
+    they started with.
+
+    Parameters:
+    model_id (str): New Bedrock model id. Defaults to the current BEDROCK_MODEL_ID.
+    """
+    global _runtime
+
+    if model_id:
+        os.environ["BEDROCK_MODEL_ID"] = model_id
+
+    _runtime = chatbot_runtime(os.getenv("BEDROCK_MODEL_ID"))
+
+    return _runtime
+
+
+_startup_cpu_seconds: float | None = None
+_started_at: float | None = None
+
+
+def get_process_stats() -> dict:
+    """
+    Returns the CPU time the worker spent importing and starting up, which is
+    dominated by module imports, and its peak resident memory.
+    """
+    return {
+        "startup_cpu_seconds": _startup_cpu_seconds,
+        "uptime_seconds": time.monotonic() - _started_at if _started_at else None,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _startup_cpu_seconds, _started_at
+
+    get_runtime()
+    start_feed_refresher()
+    start_latency_matrices()
+
+    _startup_cpu_seconds = time.process_time()
+    _started_at = time.monotonic()
+
+    yield
+
+    await stop_latency_matrices()
+    await stop_feed_refresher()
+    await close_http_client()
@@ -0,0 +1,74 @@
+import sys
+
+from botocore.loaders import create_loader
+
+
+class service_availability_index:
+    """
+    Region to service availability built once from the endpoint data bundled with
+    botocore, with every region and service name interned.
+
+    Services that are not regionalized, e.g. IAM, are listed in every region of
+    their partition. Services only resolved through endpoint rules and absent from
+    the bundled data are not listed.
+
+    Parameters:
+    endpoints (dict): The parsed endpoints.json of botocore.
+    """
+
+    def __init__(self, endpoints: dict):
+        services_by_region: dict[str, set[str]] = {}
+        regions_by_service: dict[str, set[str]] = {}
+
+        for partition in endpoints["partitions"]:
+            regions = [sys.intern(region) for region in partition["regions"]]
+            for region in regions:
+                services_by_region.setdefault(region, set())
+
+            for service_name, service in partition["services"].items():
+                service_name = sys.intern(service_name)
+
+                if service.get("isRegionalized", True) is False:
+                    available = regions
+                else:
+                    available = [
+                        region
+                        for region, endpoint in service.get("endpoints", {}).items()
+                        if region in partition["regions"]
+                        and not endpoint.get("deprecated")
+                    ]
+
+                for region in available:
+                    region = sys.intern(region)
+                    services_by_region[region].add(service_name)
+                    regions_by_service.setdefault(service_name, set()).add(region)
+
+        self.services_by_region = {
+            region: tuple(sorted(services))
+            for region, services in services_by_region.items()
+        }
+        self.regions_by_service = {
+            service_name: tuple(sorted(regions))
+            for service_name, regions in regions_by_service.items()
+        }
+
+    def services(self, region_name: str) -> tuple[str, ...] | None:
+        return self.services_by_region.get(region_name.strip().lower())
+
+    def regions(self, service_name: str) -> tuple[str, ...] | None:
+        return self.regions_by_service.get(service_name.strip().lower())
+
+
+_index: service_availability_index | None = None
+
+
+def get_service_index() -> service_availability_index:
+    """
+    Returns the process-wide service availability index, building it on first use.
+    """
+    global _index
+
+    if _index is None:
+        _index = service_availability_index(create_loader().load_data("endpoints"))
+
+    return _index
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+from typing import AsyncGenerator, AsyncIterator
+
+CHAT_STREAM_FORMAT = os.getenv("CHAT_STREAM_FORMAT", "text")
+CHAT_STREAM_FLUSH_BYTES = int(os.getenv("CHAT_STREAM_FLUSH_BYTES", "256"))
+CHAT_STREAM_FLUSH_INTERVAL = float(os.getenv("CHAT_STREAM_FLUSH_INTERVAL", "0.05"))
+
+STREAM_MEDIA_TYPES = {
+    "text": "text/plain",
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+if CHAT_STREAM_FORMAT not in STREAM_MEDIA_TYPES:
+    print(
+        f"Unknown CHAT_STREAM_FORMAT {CHAT_STREAM_FORMAT!r}, expected one of "
+        f"{', '.join(STREAM_MEDIA_TYPES)}. Falling back to text."
+    )
+    CHAT_STREAM_FORMAT = "text"
+
+TEXT_SENTINELS = {
+    "message_received": "<|message_received|>",
+    "tool_start": "<|tool_call|>",
+    "error": "<|generation_error|>",
+}
+
+
+def frame_event(event: dict, stream_format: str) -> str:
+    """
+    Serializes a /chat event for the wire.
+
+    Parameters:
+    event (dict): The event, with its kind in "type" and any payload alongside.
+    stream_format (str): "sse" for Server-Sent Events, "ndjson" for one JSON object
+        per line, or "text" for plain text with <|...|> sentinels.
+
+    Returns:
+    str: The framed event, empty if the format has no representation for it.
+    """
+    if stream_format == "sse":
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    if stream_format == "ndjson":
+        return json.dumps(event) + "\n"
+
+    if event["type"] == "text":
+        return event["text"]
+
+    return TEXT_SENTINELS.get(event["type"], "")
+
+
+async def coalesce_text(
+    events: AsyncIterator[dict], flush_bytes: int, flush_interval: float
+) -> AsyncGenerator[dict, None]:
+    """
+    Merges consecutive text events so that a stream is written in fewer, larger
+    chunks. Buffered text is flushed once it reaches flush_bytes characters, once
+    it has been held for flush_interval seconds, or before any other event.
+
+    Parameters:
+    events (AsyncIterator[dict]): The /chat events.
+    flush_bytes (int): Buffered characters that trigger a flush.
+    flush_interval (float): Maximum seconds text is held. 0 disables coalescing.
+    """
+    if flush_interval <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer = []
+    size = 0
+    deadline = None
+    next_event = None
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(events.__anext__())
+
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait({next_event}, timeout=timeout)
+
+            if done:
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    next_event = None
+                    break
+                next_event = None
+
+                if event["type"] == "text":
+                    buffer.append(event["text"])
+                    size += len(event["text"])
+                    if deadline is None:
+                        deadline = loop.time() + flush_interval
+
+                    if size < flush_bytes:
+                        continue
+                elif buffer:
+                    yield {"type": "text", "text": "".join(buffer)}
+                    buffer, size, deadline = [], 0, None
+
+            if buffer:
+                yield {"type": "text", "text": "".join(buffer)}
+                buffer, size, deadline = [], 0, None
+
+            if done and event["type"] != "text":
+                yield event
+
+        if buffer:
+            yield {"type": "text", "text": "".join(buffer)}
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+
+        await events.aclose()
+
+
+async def frame_stream(
+    events: AsyncIterator[dict], stream_format: str
+) -> AsyncGenerator[str, None]:
+    """
+    Coalesces and frames the events of a /chat response.
+
+    Parameters:
+    events (AsyncIterator[dict]): The /chat events.
+    stream_format (str): One of STREAM_MEDIA_TYPES.
+    """
+    async for event in coalesce_text(
+        events, CHAT_STREAM_FLUSH_BYTES, CHAT_STREAM_FLUSH_INTERVAL
+    ):
+        framed = frame_event(event, stream_format)
+        if framed:
+            yield framed
@@ -0,0 +1,71 @@
+import os
+import sys
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("BEDROCK_MODEL_ID", "testing")
+os.environ.setdefault("CHATBOT_API_KEY", "testing")
+os.environ.setdefault("HEALTH_FEED_BACKGROUND_REFRESH", "false")
+os.environ.setdefault("LATENCY_MATRIX_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boto3  # noqa: E402
+import pytest  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+import dynamodb_client  # noqa: E402
+
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        dynamodb_client._client = None
+        yield boto3.client("dynamodb")
+        dynamodb_client._client = None
+
+
+@pytest.fixture
+def ping_table(dynamodb):
+    dynamodb.create_table(
+        TableName="PingDB",
+        KeySchema=[
+            {"AttributeName": "origin", "KeyType": "HASH"},
+            {"AttributeName": "destination#timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "origin", "AttributeType": "S"},
+            {"AttributeName": "destination#timestamp", "AttributeType": "S"},
+            {"AttributeName": "destination", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "destination-timestamp-index",
+                "KeySchema": [
+                    {"AttributeName": "destination", "KeyType": "HASH"},
+                    {"AttributeName": "timestamp", "KeyType": "RANGE"},
+                ],
+                "Projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": ["latency"],
+                },
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+    def put_ping(origin: str, destination: str, timestamp: str, latency: float):
+        dynamodb.put_item(
+            TableName="PingDB",
+            Item={
+                "origin": {"S": origin},
+                "destination": {"S": destination},
+                "timestamp": {"S": timestamp},
+                "destination#timestamp": {"S": f"{destination}#{timestamp}"},
+                "latency": {"N": str(latency)},
+            },
+        )
+
+    return put_ping
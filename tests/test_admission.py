@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import admission_controller
+
+
+def test_session_wait_is_not_bounded_by_queue_timeout():
+    async def run() -> dict:
+        controller = admission_controller(4, 1, 0.1)
+        first = await controller.admit("session")
+        second = asyncio.create_task(controller.admit("session"))
+
+        await asyncio.sleep(0.3)
+        stats = controller.stats()
+        first.release()
+        (await second).release()
+
+        return stats | {"sessions_after": controller.stats()["sessions"]}
+
+    stats = asyncio.run(run())
+
+    assert stats["waiting_for_session"] == 1
+    assert stats["queued"] == 0
+    assert stats["rejected_timeout"] == 0
+    assert stats["sessions_after"] == 0
+
+
+def test_slot_wait_times_out():
+    async def run():
+        controller = admission_controller(1, 1, 0.1)
+        ticket = await controller.admit("a")
+        try:
+            with pytest.raises(HTTPException) as waited:
+                await controller.admit("b")
+            assert waited.value.status_code == 503
+
+            waiting = asyncio.create_task(controller.admit("c"))
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as rejected:
+                await controller.admit("d")
+            assert rejected.value.status_code == 429
+        finally:
+            ticket.release()
+
+        (await waiting).release()
+        assert controller.stats()["sessions"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import http_client
+from health_feeds import HEALTH_FEEDS
+from tools import get_aws_health
+
+SLOW_FEED_SECONDS = 0.5
+
+
+@pytest.fixture
+def slow_health_endpoint():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/public/currentevents":
+            await asyncio.sleep(SLOW_FEED_SECONDS)
+        return httpx.Response(200, json=[])
+
+    for feed in HEALTH_FEEDS.values():
+        feed.data = feed.etag = feed.last_modified = feed.fetched_at = None
+        feed.refresh_task = None
+
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield
+    http_client._client = None
+
+
+def test_slow_health_feed_does_not_block_other_streams(slow_health_endpoint):
+    async def stream():
+        while True:
+            await asyncio.sleep(0.01)
+            yield time.monotonic()
+
+    async def consume(received: list[float]):
+        async for chunk in stream():
+            received.append(chunk)
+
+    async def run() -> tuple[str, float, list[float]]:
+        received = []
+        consumer = asyncio.create_task(consume(received))
+
+        started_at = time.monotonic()
+        result = await get_aws_health.ainvoke({})
+        elapsed = time.monotonic() - started_at
+
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+
+        return result, elapsed, received
+
+    result, elapsed, received = asyncio.run(run())
+
+    assert result == (
+        "There are no current health incidents or announcements reported by AWS."
+    )
+    assert elapsed >= SLOW_FEED_SECONDS
+    assert len(received) >= SLOW_FEED_SECONDS / 0.01 / 2
+    assert max(b - a for a, b in zip(received, received[1:])) < 0.1
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+import latency_matrix
+from dynamodb_client import consumed_capacity
+from latency_matrix import latency_matrix as matrix_class
+
+
+def iso(minutes_ago: float) -> str:
+    return (datetime.now(UTC) - timedelta(minutes=minutes_ago)).strftime(
+        "%Y-%m-%dT%H:%M:%S"
+    )
+
+
+@pytest.fixture
+def matrix(ping_table, monkeypatch):
+    monkeypatch.setattr(latency_matrix, "LATENCY_MATRIX_DISCOVERY_INTERVAL", 0)
+
+    ping_table("us-east-1", "eu-west-1", iso(10), 80)
+    ping_table("us-west-2", "eu-west-1", iso(10), 140)
+    ping_table("us-east-1", "ap-south-1", iso(10), 200)
+
+    matrix = matrix_class("PingDB")
+    asyncio.run(matrix.refresh())
+
+    return matrix
+
+
+def test_refresh_reads_pings_not_newer_than_the_watermark(matrix, ping_table):
+    # Written after the build with the timestamp the build already saw, and late.
+    ping_table("us-west-1", "eu-west-1", iso(10), 120)
+    ping_table("us-west-2", "ap-south-1", iso(12), 230)
+
+    asyncio.run(matrix.refresh())
+
+    item, count = matrix.nth_to_destination("eu-west-1", 2, False, iso(60))
+    assert count == 3
+    assert item["origin"] == "us-west-1"
+
+    item, count = matrix.nth_to_destination("ap-south-1", 2, False, iso(60))
+    assert count == 2
+    assert item["origin"] == "us-west-2"
+
+
+def test_refresh_discovers_new_destinations(matrix, ping_table):
+    ping_table("us-east-1", "ca-central-1", iso(5), 20)
+    ping_table("us-east-1", "af-south-1", iso(5), 250)
+    ping_table("us-east-1", "eu-central-1", iso(6), 90)
+    ping_table("us-east-1", "eu-central-1", iso(5), 95)
+
+    asyncio.run(matrix.refresh())
+
+    assert matrix.covers(iso(60), iso(-1))
+    item, count = matrix.nth_from_source("us-east-1", 1, False, iso(60))
+    assert count == 5
+    assert item["destination"] == "ca-central-1"
+
+    item, _ = matrix.nth_to_destination("eu-central-1", 1, False, iso(60))
+    assert item["latency"] == 95
+
+
+def test_matrix_disables_itself_without_the_destination_index(dynamodb):
+    dynamodb.create_table(
+        TableName="PingDBWithoutIndex",
+        KeySchema=[
+            {"AttributeName": "origin", "KeyType": "HASH"},
+            {"AttributeName": "destination#timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "origin", "AttributeType": "S"},
+            {"AttributeName": "destination#timestamp", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    scans = consumed_capacity["scans"]
+
+    matrix = matrix_class("PingDBWithoutIndex")
+    asyncio.run(asyncio.wait_for(matrix.keep_fresh(), 5))
+
+    assert matrix.disabled
+    assert not matrix.covers(iso(60), iso(-1))
+    assert consumed_capacity["scans"] == scans
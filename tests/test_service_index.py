@@ -0,0 +1,25 @@
+import asyncio
+
+from prompts import SERVICES_MISSING_ARGUMENTS_ERROR
+from tools import get_available_services
+
+
+def call(args: dict) -> str:
+    return asyncio.run(get_available_services.ainvoke(args))
+
+
+def test_requires_regions_or_service():
+    assert call({}) == SERVICES_MISSING_ARGUMENTS_ERROR
+    assert call({"region_names": [], "service_name": ""}) == (
+        SERVICES_MISSING_ARGUMENTS_ERROR
+    )
+
+
+def test_region_and_service_names_are_case_insensitive():
+    assert call({"region_names": [" US-EAST-1 "]}) == call(
+        {"region_names": ["us-east-1"]}
+    )
+    assert call({"service_name": "Bedrock"}).startswith("Bedrock is available in")
+    assert call({"service_name": "BEDROCK", "region_names": ["US-East-1"]}) == (
+        "BEDROCK is available in 1 regions: us-east-1"
+    )
@@ -0,0 +1,13 @@
+import importlib
+
+import stream_framing
+
+
+def test_unknown_default_format_falls_back_to_text(monkeypatch, capsys):
+    monkeypatch.setenv("CHAT_STREAM_FORMAT", "json")
+    try:
+        assert importlib.reload(stream_framing).CHAT_STREAM_FORMAT == "text"
+        assert "CHAT_STREAM_FORMAT 'json'" in capsys.readouterr().out
+    finally:
+        monkeypatch.delenv("CHAT_STREAM_FORMAT")
+        importlib.reload(stream_framing)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import tool
+
+import tool_calls
+from tool_calls import tool_call_dispatcher, tool_result_cache
+from tools import get_pings_batch
+
+
+@pytest.fixture(autouse=True)
+def empty_tool_cache(monkeypatch):
+    monkeypatch.setattr(tool_calls, "tool_results", tool_result_cache(2**20))
+
+
+def run_tool(tool, args: str) -> str:
+    async def run() -> str:
+        dispatcher = tool_call_dispatcher({tool.name: tool})
+        dispatcher.feed([{"name": tool.name, "id": "1", "index": 0, "args": args}])
+        (message,) = await dispatcher.results()
+        return message.content
+
+    return asyncio.run(run())
+
+
+def test_errors_are_not_cached(monkeypatch):
+    calls = []
+
+    @tool
+    async def flaky_history(end_time: str) -> str:
+        """Fails on the first call."""
+        calls.append(end_time)
+        if len(calls) == 1:
+            raise Exception("ThrottlingException: Rate exceeded")
+        return "history"
+
+    monkeypatch.setitem(tool_calls.TOOL_CACHE_TTLS, "flaky_history", 60)
+    args = '{"end_time": "2024-01-01T00:00:00"}'
+
+    assert run_tool(flaky_history, args) == "ThrottlingException: Rate exceeded"
+    assert run_tool(flaky_history, args) == "history"
+    assert run_tool(flaky_history, args) == "history"
+    assert len(calls) == 2
+    assert tool_calls.tool_results.stats()["tools"]["flaky_history"] == {
+        "hits": 1,
+        "misses": 2,
+    }
+
+
+def test_partial_batch_failures_are_not_cached(ping_table):
+    args = '{"pairs": [["us-east-1", "eu-west-1"]], "table_name": "%s"}'
+
+    failed = run_tool(get_pings_batch, args % "MissingTable")
+    assert "us-east-1 | eu-west-1 | " in failed
+    assert tool_calls.tool_results.entries == {}
+
+    ping_table("us-east-1", "eu-west-1", "2024-01-01T00:00:00", 80)
+    succeeded = run_tool(get_pings_batch, args % "PingDB")
+    assert "us-east-1 | eu-west-1 | 2024-01-01T00:00:00 | 80" in succeeded
+    assert len(tool_calls.tool_results.entries) == 1
+
+
+def test_partial_batch_results_reach_the_model_uncached(ping_table, capsys):
+    ping_table("us-east-1", "eu-west-1", "2024-01-01T00:00:00", 80)
+    args = (
+        '{"pairs": [["us-east-1", "eu-west-1"], ["us-east-1"]], "table_name": "PingDB"}'
+    )
+
+    output = run_tool(get_pings_batch, args)
+    assert "us-east-1 | eu-west-1 | 2024-01-01T00:00:00 | 80" in output
+    assert "\nus-east-1 | not enough values to unpack" in output
+    assert tool_calls.tool_results.entries == {}
+    assert output not in capsys.readouterr().out
@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+import url_content
+from url_content import chunk_paragraphs, extract_text, select_chunks
+
+PAGE = b"""<html><head><title>Pricing</title><meta charset="utf-8">
+<style>p { color: red }</style><script>var x = "<p>hidden</p>";</script>
+<body><h1>Amazon Bedrock</h1><p>Hello <b>world</b></p>
+<ul><li>On-demand</li><li>Batch</li></ul></body></html>"""
+
+
+@pytest.fixture
+def page_server(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200, content=b"<p>" + b"a " * 5000 + b"</p>", headers={"ETag": '"1"'}
+        )
+
+    monkeypatch.setattr(url_content, "URL_LOADER_MAX_BYTES", 1000)
+    monkeypatch.setattr(
+        url_content, "url_contents", url_content.url_content_cache(0, 8)
+    )
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield requests
+    http_client._client = None
+
+
+def test_extract_text_without_head_end_tag():
+    assert extract_text(PAGE, "utf-8", True) == [
+        "Amazon Bedrock",
+        "Hello world",
+        "On-demand",
+        "Batch",
+    ]
+
+
+def test_extract_plain_text_paragraphs():
+    assert extract_text(b"one\n two\n\n\nthree", "utf-8", False) == [
+        "one two",
+        "three",
+    ]
+
+
+def test_select_chunks_ranks_by_query_and_keeps_document_order():
+    chunks = ["ec2 instance types", "bedrock pricing per token", "s3 storage"]
+
+    assert select_chunks(list(chunks), "Bedrock pricing", 30) == [chunks[1]]
+    assert select_chunks(list(chunks), "bedrock s3", 50) == chunks[1:]
+    assert select_chunks(list(chunks), None, 45) == chunks[:2]
+
+
+def test_select_chunks_of_empty_page():
+    assert select_chunks([], "bedrock pricing", 8000) == []
+    assert select_chunks([], None, 8000) == []
+
+
+def test_chunk_paragraphs_splits_long_paragraphs():
+    chunks = chunk_paragraphs(["word " * 50, "short"], 40)
+
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert (
+        " ".join(" ".join(chunks).split())
+        == " ".join(("word " * 50).split()) + " short"
+    )
+
+
+def test_download_is_capped_and_revalidated(page_server):
+    paragraphs = asyncio.run(url_content.url_contents.get("https://example.com"))
+
+    assert len(paragraphs[0]) < 1000
+    assert url_content.url_contents.stats()["truncated"] == 1
+    assert "If-None-Match" not in page_server[0].headers
+
+    asyncio.run(url_content.url_contents.get("https://example.com"))
+    assert page_server[1].headers["If-None-Match"] == '"1"'
@@ -21,3 +21,15 @@ async def unix_to_iso_8601(unix_string: str) -> str:
         print(e)
         
         raise
+
+
+def iso_8601_to_unix(iso8601_string: str) -> float:
+    try:
+        dt = datetime.fromisoformat(iso8601_string)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=UTC)
+        return dt.timestamp()
+    except Exception as e:
+        print(e)
+        
+        raise
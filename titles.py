@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage
+
+from chat_history import message_text, split_turns
+
+TITLE_TURNS = int(os.getenv("TITLE_TURNS", "2"))
+TITLE_MESSAGE_CHARS = int(os.getenv("TITLE_MESSAGE_CHARS", "1000"))
+TITLE_CACHE_MAX_SESSIONS = int(os.getenv("TITLE_CACHE_MAX_SESSIONS", "10000"))
+
+
+def title_prefix(messages: list[BaseMessage]) -> list[dict]:
+    """
+    Returns the beginning of a transcript that a title is generated from: the text
+    of the human and AI messages of the first TITLE_TURNS turns, each cut to
+    TITLE_MESSAGE_CHARS characters. Tool calls and results are left out.
+    """
+    prefix = []
+    for turn in split_turns(messages)[:TITLE_TURNS]:
+        for message in turn:
+            text = message_text(message).strip()
+            if message.type != "tool" and text:
+                prefix.append(
+                    {"type": message.type, "content": text[:TITLE_MESSAGE_CHARS]}
+                )
+
+    return prefix
+
+
+def prefix_digest(prefix: list[dict]) -> str:
+    return hashlib.sha256(json.dumps(prefix).encode()).hexdigest()
+
+
+class title_cache:
+    """
+    LRU cache of generated titles, keyed by session id and holding the digest of
+    the prefix each title was generated from. A title is reused for as long as the
+    beginning of its conversation is unchanged.
+
+    Parameters:
+    max_sessions (int): Maximum number of cached titles.
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+
+        self.entries: OrderedDict[str, tuple[str, str]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str, digest: str) -> str | None:
+        entry = self.entries.get(session_id)
+        if entry is None or entry[0] != digest:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(session_id)
+
+        return entry[1]
+
+    def put(self, session_id: str, digest: str, title: str):
+        self.entries[session_id] = (digest, title)
+        self.entries.move_to_end(session_id)
+
+        while len(self.entries) > self.max_sessions:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, session_id: str):
+        self.entries.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "titles": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+titles = title_cache(TITLE_CACHE_MAX_SESSIONS)
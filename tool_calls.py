@@ -0,0 +1,315 @@
+import asyncio
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+
+from prompts import *
+from timezone import iso_8601_to_unix
+
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+
+
+def parse_tool_timeouts(value: str) -> dict[str, float]:
+    """
+    Parses per-tool durations in the form "tool_name=seconds,tool_name=seconds".
+
+    Parameters:
+    value (str): The raw TOOL_TIMEOUTS or TOOL_CACHE_TTLS setting.
+
+    Returns:
+    dict[str, float]: Seconds keyed by tool name.
+    """
+    timeouts = {}
+    for entry in value.split(","):
+        if "=" in entry:
+            name, seconds = entry.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+
+    return timeouts
+
+
+TOOL_TIMEOUTS = parse_tool_timeouts(os.getenv("TOOL_TIMEOUTS", ""))
+
+TOOL_CACHE_TTLS = {
+    "get_available_services": 86400,
+    "get_aws_health": 30,
+    "get_aws_health_history": 300,
+    "get_nth_ping_given_destination": 30,
+    "get_nth_ping_given_source": 30,
+    "get_ping_statistics": 60,
+    "get_pings": 30,
+    "get_pings_batch": 30,
+} | parse_tool_timeouts(os.getenv("TOOL_CACHE_TTLS", ""))
+TOOL_CACHE_CLOSED_RANGE_TTL = float(os.getenv("TOOL_CACHE_CLOSED_RANGE_TTL", "3600"))
+TOOL_CACHE_CLOSED_RANGE_DELAY = float(os.getenv("TOOL_CACHE_CLOSED_RANGE_DELAY", "600"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(16 * 2**20)))
+CLOSED_RANGE_ARGUMENTS = ("time_upper_bound", "end_time")
+
+
+class partial_result(str):
+    """
+    Output of a tool that only partly succeeded, e.g. a batch with failed rows. It
+    reaches the model like any other output but is never cached.
+    """
+
+
+class tool_result_cache:
+    """
+    LRU cache of tool outputs keyed by tool name and canonical arguments, bounded
+    by the total size of the cached outputs.
+
+    Each tool is cached for its TTL from TOOL_CACHE_TTLS; tools without one are
+    not cached. Only successful outputs are cached: tools report failures by
+    raising, and the dispatcher turns the exception into the message for the
+    model without caching it, as it does with a partial_result. Historical calls whose time range ended at least
+    TOOL_CACHE_CLOSED_RANGE_DELAY seconds ago cannot change any more and are
+    cached for TOOL_CACHE_CLOSED_RANGE_TTL instead.
+
+    Parameters:
+    max_bytes (int): Maximum total length of the cached outputs.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+        self.entries: OrderedDict[tuple[str, str], tuple[str, float]] = OrderedDict()
+        self.bytes = 0
+
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+
+    @staticmethod
+    def ttl(name: str, tool_args: dict) -> float:
+        ttl = TOOL_CACHE_TTLS.get(name, 0)
+        if not ttl or tool_args.get("latest"):
+            return ttl
+
+        for argument in CLOSED_RANGE_ARGUMENTS:
+            if tool_args.get(argument):
+                try:
+                    upper_bound = iso_8601_to_unix(tool_args[argument])
+                except ValueError:
+                    return ttl
+
+                if upper_bound <= time.time() - TOOL_CACHE_CLOSED_RANGE_DELAY:
+                    return max(ttl, TOOL_CACHE_CLOSED_RANGE_TTL)
+
+        return ttl
+
+    @staticmethod
+    def key(name: str, tool_args: dict) -> tuple[str, str]:
+        return name, json.dumps(tool_args, sort_keys=True, default=str)
+
+    def get(self, name: str, tool_args: dict) -> str | None:
+        if not TOOL_CACHE_TTLS.get(name):
+            return None
+
+        key = self.key(name, tool_args)
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() >= entry[1]:
+            self.misses[name] += 1
+            return None
+
+        self.hits[name] += 1
+        self.entries.move_to_end(key)
+
+        return entry[0]
+
+    def put(self, name: str, tool_args: dict, tool_output: str):
+        ttl = self.ttl(name, tool_args)
+        if not ttl or not isinstance(tool_output, str):
+            return
+
+        key = self.key(name, tool_args)
+        if key in self.entries:
+            self.bytes -= len(self.entries[key][0])
+
+        self.entries[key] = (tool_output, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        self.bytes += len(tool_output)
+
+        while self.bytes > self.max_bytes and self.entries:
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "tools": {
+                name: {"hits": self.hits[name], "misses": self.misses[name]}
+                for name in sorted(self.hits | self.misses)
+            },
+        }
+
+
+tool_results = tool_result_cache(TOOL_CACHE_MAX_BYTES)
+
+
+class tool_call_arguments:
+    """
+    Assembles the JSON arguments of one tool call from streamed fragments and
+    detects when the top-level object is closed, without reparsing the buffer on
+    every fragment.
+
+    Parameters:
+    name (str): Name of the called tool.
+    tool_call_id (str): Id the tool result must reference.
+    """
+
+    def __init__(self, name: str, tool_call_id: str):
+        self.name = name
+        self.tool_call_id = tool_call_id
+
+        self.buffer = ""
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, fragment: str) -> bool:
+        """
+        Appends a fragment of the arguments.
+
+        Returns:
+        bool: True if the fragment closed the top-level JSON object.
+        """
+        self.buffer += fragment
+
+        for character in fragment:
+            if self.complete:
+                break
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif character == "\\":
+                    self.escaped = True
+                elif character == '"':
+                    self.in_string = False
+            elif character == '"':
+                self.in_string = True
+            elif character in "{[":
+                self.depth += 1
+                self.started = True
+            elif character in "}]":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    self.complete = True
+                    return True
+
+        return False
+
+    def parse(self) -> dict:
+        return json.loads(self.buffer) if self.buffer.strip() else {}
+
+
+class tool_call_dispatcher:
+    """
+    Runs the tool calls of a model turn while the model is still streaming. Each
+    call is validated against its tool's input schema and started as soon as its
+    arguments are complete, so tool latency overlaps with the rest of the
+    generation.
+
+    At most TOOL_CONCURRENCY calls run at once and each call is bounded by its
+    timeout from TOOL_TIMEOUTS, falling back to TOOL_TIMEOUT. A call that times
+    out, raises or has invalid arguments is answered with an error message for the
+    model instead of failing the turn. cancel() stops every pending call, e.g.
+    when the client disconnected.
+
+    Parameters:
+    tools (dict[str, BaseTool]): Tool registry keyed by tool name.
+    """
+
+    def __init__(self, tools: dict[str, BaseTool]):
+        self.tools = tools
+        self.semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+        self.calls: dict[int, tool_call_arguments] = {}
+        self.tasks: dict[int, asyncio.Task] = {}
+
+    def feed(self, tool_call_chunks: list[dict]):
+        """
+        Adds the tool call chunks of one streamed message chunk, starting every call
+        whose arguments they complete.
+        """
+        for tool_call_chunk in tool_call_chunks:
+            index = tool_call_chunk.get("index") or 0
+            if index not in self.calls:
+                self.calls[index] = tool_call_arguments(
+                    tool_call_chunk.get("name"), tool_call_chunk.get("id")
+                )
+
+            call = self.calls[index]
+            call.name = call.name or tool_call_chunk.get("name")
+            call.tool_call_id = call.tool_call_id or tool_call_chunk.get("id")
+
+            if call.feed(tool_call_chunk.get("args") or ""):
+                self.dispatch(index)
+
+    def dispatch(self, index: int):
+        if index not in self.tasks:
+            self.tasks[index] = asyncio.create_task(self.run(self.calls[index]))
+
+    async def run(self, call: tool_call_arguments) -> ToolMessage:
+        try:
+            selected_tool = self.tools[call.name]
+            tool_args = call.parse()
+            canonical_args = (
+                selected_tool.get_input_schema().model_validate(tool_args).model_dump()
+            )
+        except Exception as e:
+            print(e)
+
+            return ToolMessage(
+                TOOL_ARGUMENTS_ERROR.format(call.name, e),
+                tool_call_id=call.tool_call_id,
+            )
+
+        tool_output = tool_results.get(call.name, canonical_args)
+        if tool_output is not None:
+            return ToolMessage(tool_output, tool_call_id=call.tool_call_id)
+
+        timeout = TOOL_TIMEOUTS.get(call.name, TOOL_TIMEOUT)
+
+        async with self.semaphore:
+            try:
+                tool_output = await asyncio.wait_for(
+                    selected_tool.ainvoke(tool_args), timeout
+                )
+                if not isinstance(tool_output, partial_result):
+                    tool_results.put(call.name, canonical_args, tool_output)
+            except TimeoutError:
+                tool_output = TOOL_TIMEOUT_ERROR.format(call.name, timeout)
+            except Exception as e:
+                print(e)
+
+                tool_output = str(e)
+
+        return ToolMessage(tool_output, tool_call_id=call.tool_call_id)
+
+    async def results(self) -> list[ToolMessage]:
+        """
+        Starts the calls still waiting for their arguments, e.g. tools without
+        parameters, and waits for every call of the turn.
+
+        Returns:
+        list[ToolMessage]: One message per tool call, in the order the model made
+        them.
+        """
+        for index in self.calls:
+            self.dispatch(index)
+
+        return await asyncio.gather(
+            *(self.tasks[index] for index in sorted(self.tasks))
+        )
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
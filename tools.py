@@ -1,13 +1,28 @@
-import boto3
-import requests
+import asyncio
+
 from boto3.dynamodb.conditions import Attr, Key
 from langchain.tools import tool
-from langchain_community.document_loaders import UnstructuredURLLoader
-from langchain_community.tools import DuckDuckGoSearchResults
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 
+from dynamodb_client import query_items
+from health_feeds import announcement_feed, current_events_feed, history_events_feed
+from latency_matrix import get_latency_matrix
+from ping_queries import *
+from ping_statistics import *
 from prompts import *
-from timezone import unix_to_iso_8601
+from service_index import get_service_index
+from timezone import iso_8601_to_unix, unix_to_iso_8601
+from tool_calls import partial_result
+from url_content import load_url
+from web_search import search_results
+
+
+def nth_ping_result(item: dict | None, count: int, n: int, region: str) -> str:
+    if count == 0:
+        return PING_NOT_RECORDED_ERROR["single"].format(region)
+    elif item is None:
+        return NOT_ENOUGH_ENTRY_ERROR.format(n, count)
+
+    return str(item)
 
 
 @tool
@@ -34,58 +49,188 @@ async def get_pings(
     Returns:
     str: A string representation of the query results, or an error message.
     """
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
-
-    key_conditions = Key("origin").eq(source_region) & Key(
-        "destination#timestamp"
-    ).begins_with(destination + "#")
-
-    filter_expression = Attr("destination").eq(destination)
     if latest is False:
+        key_conditions = ping_key_condition(
+            source_region, destination, time_lower_bound, time_upper_bound
+        )
+        items = [item async for item in query_items(table_name, key_conditions)]
+    else:
+        key_conditions = ping_key_condition(source_region, destination)
+        items = [
+            item
+            async for item in query_items(
+                table_name, key_conditions, scan_index_forward=False, limit=1
+            )
+        ]
+
+    if items:
+        return str(items)
+    else:
         if time_lower_bound and time_upper_bound:
-            filter_expression &= Attr("timestamp").between(
-                time_lower_bound, time_upper_bound
+            return PING_NOT_RECORDED_ERROR["between"].format(
+                source_region, destination, time_lower_bound, time_upper_bound
             )
         elif time_lower_bound:
-            filter_expression &= Attr("timestamp").gte(time_lower_bound)
-        elif time_upper_bound:
-            filter_expression &= Attr("timestamp").lte(time_upper_bound)
-
-    try:
-        if latest is False:
-            response = table.query(
-                KeyConditionExpression=key_conditions,
-                FilterExpression=filter_expression,
+            return PING_NOT_RECORDED_ERROR["after"].format(
+                source_region, destination, time_lower_bound
             )
-        else:
-            response = table.query(
-                KeyConditionExpression=key_conditions,
-                FilterExpression=filter_expression,
-                ScanIndexForward=False,
-                Limit=1,
+        elif time_upper_bound:
+            return PING_NOT_RECORDED_ERROR["before"].format(
+                source_region, destination, time_upper_bound
             )
 
-        if response["Items"]:
-            return str(response["Items"])
-        else:
-            if time_lower_bound and time_upper_bound:
-                return PING_NOT_RECORDED_ERROR["between"].format(
+        return PING_NOT_RECORDED_ERROR["default"].format(source_region, destination)
+
+
+@tool
+async def get_pings_batch(
+    pairs: list[list[str]],
+    table_name: str,
+    latest: bool = True,
+    time_lower_bound: str = None,
+    time_upper_bound: str = None,
+) -> str:
+    """
+    Queries latency data for several source/destination pairs at once and returns one table.
+    Time range required if latest is False.
+
+    Parameters:
+    pairs (list[list[str]]): Pairs of [source AWS region code, destination region code or city name], e.g. [["us-east-1", "eu-west-1"], ["us-east-1", "ap-south-1"]].
+    table_name (str): Name of the DynamoDB table to query.
+    latest (bool): Set to True for the latest ping of each pair, or False for latency statistics of each pair over the time range. Defaults to True.
+    time_lower_bound (str): ISO 8601 formatted string. UTC.
+    time_upper_bound (str): ISO 8601 formatted string. UTC.
+
+    Returns:
+    str: One row per pair with the latest ping or the latency statistics, or an error message.
+    """
+    if len(pairs) > PING_BATCH_MAX_PAIRS:
+        return TOO_MANY_PAIRS_ERROR.format(PING_BATCH_MAX_PAIRS)
+
+    async def latest_row(source_region: str, destination: str) -> str:
+        async for item in query_items(
+            table_name,
+            ping_key_condition(source_region, destination),
+            projection=PING_ATTRIBUTES,
+            scan_index_forward=False,
+            limit=1,
+        ):
+            return f"{source_region} | {destination} | {item['timestamp']} | {item['latency']}"
+
+        return f"{source_region} | {destination} | no data | no data"
+
+    async def statistics_row(source_region: str, destination: str) -> str:
+        epochs, latencies = await collect_pings(
+            query_items(
+                table_name,
+                ping_key_condition(
                     source_region, destination, time_lower_bound, time_upper_bound
-                )
-            elif time_lower_bound:
-                return PING_NOT_RECORDED_ERROR["after"].format(
-                    source_region, destination, time_lower_bound
-                )
-            elif time_upper_bound:
-                return PING_NOT_RECORDED_ERROR["before"].format(
-                    source_region, destination, time_upper_bound
-                )
+                ),
+                projection=["timestamp", "latency"],
+            )
+        )
+
+        if len(latencies) == 0:
+            return f"{source_region} | {destination} | 0"
+
+        statistics = summarize(latencies)
+        return " | ".join(
+            [source_region, destination, str(statistics.pop("count"))]
+            + [f"{value:.2f}" for value in statistics.values()]
+        )
 
-            return PING_NOT_RECORDED_ERROR["default"].format(source_region, destination)
+    failed = False
 
-    except Exception as e:
-        return str(e)
+    async def row(pair: list[str]) -> str:
+        nonlocal failed
+
+        try:
+            source_region, destination = pair
+            if latest is False:
+                return await statistics_row(source_region, destination)
+
+            return await latest_row(source_region, destination)
+        except Exception as e:
+            failed = True
+            return f"{' | '.join(map(str, pair))} | {e}"
+
+    if latest is False:
+        header = (
+            "source_region | destination | count | min | mean | p50 | p95 | p99 | max"
+        )
+    else:
+        header = "source_region | destination | timestamp | latency"
+
+    rows = await asyncio.gather(*(row(pair) for pair in pairs))
+    result = "\n".join([header, *rows])
+
+    return partial_result(result) if failed else result
+
+
+@tool
+async def get_ping_statistics(
+    source_region: str,
+    destination: str,
+    table_name: str,
+    time_lower_bound: str,
+    time_upper_bound: str,
+    bucket_minutes: int = None,
+) -> str:
+    """
+    Summarizes the latency between a source region and a destination over a time range.
+    Prefer this over get_pings for historical questions, as it returns statistics instead of every ping.
+
+    Parameters:
+    source_region (str): AWS region code for the source region.
+    destination (str): AWS region code when r2r or city name for the destination when r2l.
+    table_name (str): Name of the DynamoDB table to query.
+    time_lower_bound (str): ISO 8601 formatted string. UTC.
+    time_upper_bound (str): ISO 8601 formatted string. UTC.
+    bucket_minutes (int): Optional bucket length in minutes to also summarize each interval, e.g. 60 for hourly.
+
+    Returns:
+    str: Count, min, mean, p50, p95, p99 and max latency overall and per bucket, or an error message.
+    """
+    if bucket_minutes:
+        start = iso_8601_to_unix(time_lower_bound)
+        interval = bucket_minutes * 60
+        bucket_count = (iso_8601_to_unix(time_upper_bound) - start) / interval
+        if bucket_minutes < 0 or bucket_count > PING_STATISTICS_MAX_BUCKETS:
+            return TOO_MANY_BUCKETS_ERROR.format(PING_STATISTICS_MAX_BUCKETS)
+
+    epochs, latencies = await collect_pings(
+        query_items(
+            table_name,
+            ping_key_condition(
+                source_region, destination, time_lower_bound, time_upper_bound
+            ),
+            projection=["timestamp", "latency"],
+        )
+    )
+
+    if len(latencies) == 0:
+        return PING_NOT_RECORDED_ERROR["between"].format(
+            source_region, destination, time_lower_bound, time_upper_bound
+        )
+
+    result = PING_STATISTICS.format(
+        source_region,
+        destination,
+        time_lower_bound,
+        time_upper_bound,
+        format_statistics(summarize(latencies)),
+    )
+
+    if bucket_minutes:
+        for bucket_start, statistics in bucket_statistics(
+            epochs, latencies, start, interval
+        ):
+            result += "\n{}: {}".format(
+                await unix_to_iso_8601(int(bucket_start)),
+                format_statistics(statistics),
+            )
+
+    return result
 
 
 @tool
@@ -111,45 +256,44 @@ async def get_nth_ping_given_source(
     Returns:
     str: A string representation of the query result, or an error message.
     """
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
+    matrix = get_latency_matrix(table_name)
+    if matrix is not None:
+        if matrix.covers(time_lower_bound, time_upper_bound):
+            matrix.hits += 1
+            item, count = matrix.nth_from_source(
+                source_region, n, highest, time_lower_bound
+            )
+
+            return nth_ping_result(item, count, n, source_region)
+
+        matrix.fallbacks += 1
 
     key_conditions = Key("origin").eq(source_region)
 
     filter_expression = Attr("timestamp").between(time_lower_bound, time_upper_bound)
 
-    try:
-        response = table.query(
-            KeyConditionExpression=key_conditions,
-            FilterExpression=filter_expression,
-            ScanIndexForward=not highest,
+    latest_pings = await latest_pings_by(
+        "destination",
+        query_items(
+            table_name,
+            key_conditions,
+            filter_expression,
+            projection=PING_ATTRIBUTES,
+        ),
+    )
+
+    if latest_pings:
+        items = sorted(
+            latest_pings.values(),
+            key=lambda x: float(x["latency"]),
+            reverse=highest,
         )
-
-        if "Items" in response:
-            latest_pings = {}
-            for item in response["Items"]:
-                destination = item["destination"]
-                if destination not in latest_pings:
-                    latest_pings[destination] = item
-                else:
-                    current_timestamp = latest_pings[destination]["timestamp"]
-                    if item["timestamp"] > current_timestamp:
-                        latest_pings[destination] = item
-
-            items = sorted(
-                latest_pings.values(),
-                key=lambda x: float(x["latency"]),
-                reverse=highest,
-            )
-            if len(items) >= n:
-                return str(items[n - 1])
-            else:
-                return NOT_ENOUGH_ENTRY_ERROR.format(n, len(items))
+        if len(items) >= n:
+            return str(items[n - 1])
         else:
-            return PING_NOT_RECORDED_ERROR["single"].format(source_region)
-
-    except Exception as e:
-        return str(e)
+            return NOT_ENOUGH_ENTRY_ERROR.format(n, len(items))
+    else:
+        return PING_NOT_RECORDED_ERROR["single"].format(source_region)
 
 
 @tool
@@ -175,42 +319,37 @@ async def get_nth_ping_given_destination(
     Returns:
     str: A string representation of the query result, or an error message.
     """
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
-
-    try:
-        scan_kwargs = {
-            "FilterExpression": Attr("destination").eq(destination)
-            & Attr("timestamp").between(time_lower_bound, time_upper_bound)
-        }
-
-        response = table.scan(**scan_kwargs)
-
-        if "Items" in response:
-            latest_pings = {}
-            for item in response["Items"]:
-                source_region = item["origin"]
-                if source_region not in latest_pings:
-                    latest_pings[source_region] = item
-                else:
-                    current_timestamp = latest_pings[source_region]["timestamp"]
-                    if item["timestamp"] > current_timestamp:
-                        latest_pings[source_region] = item
-
-            items = sorted(
-                latest_pings.values(),
-                key=lambda x: float(x["latency"]),
-                reverse=highest,
+    matrix = get_latency_matrix(table_name)
+    if matrix is not None:
+        if matrix.covers(time_lower_bound, time_upper_bound):
+            matrix.hits += 1
+            item, count = matrix.nth_to_destination(
+                destination, n, highest, time_lower_bound
             )
-            if len(items) >= n:
-                return str(items[n - 1])
-            else:
-                return NOT_ENOUGH_ENTRY_ERROR.format(n, len(items))
-        else:
-            return PING_NOT_RECORDED_ERROR["single"].format(destination)
 
-    except Exception as e:
-        return str(e)
+            return nth_ping_result(item, count, n, destination)
+
+        matrix.fallbacks += 1
+
+    latest_pings = await latest_pings_by(
+        "origin",
+        ping_items_to_destination(
+            table_name, destination, time_lower_bound, time_upper_bound
+        ),
+    )
+
+    if latest_pings:
+        items = sorted(
+            latest_pings.values(),
+            key=lambda x: float(x["latency"]),
+            reverse=highest,
+        )
+        if len(items) >= n:
+            return str(items[n - 1])
+        else:
+            return NOT_ENOUGH_ENTRY_ERROR.format(n, len(items))
+    else:
+        return PING_NOT_RECORDED_ERROR["single"].format(destination)
 
 
 @tool
@@ -224,65 +363,51 @@ async def get_aws_health() -> str:
             - If both JSONs are empty, returns "There are no current health incidents or announcements reported by AWS."
             - If the JSONs contain data, returns the JSON data as a string.
     """
-    try:
-        health_response = requests.get(
-            "https://health.aws.amazon.com/public/currentevents",
-            timeout=10,
-        )
-        health_response.raise_for_status()
-        health_data = health_response.json()
+    health_data, announcement_data = await asyncio.gather(
+        current_events_feed.get(), announcement_feed.get()
+    )
 
-        announcement_response = requests.get(
-            "https://health.aws.amazon.com/public/announcement",
-            timeout=10,
-        )
-        announcement_response.raise_for_status()
-        announcement_data = announcement_response.json()
+    results = {"health_incidents": health_data, "announcements": announcement_data}
 
-        results = {"health_incidents": health_data, "announcements": announcement_data}
-
-        if not health_data and not announcement_data:
-            return "There are no current health incidents or announcements reported by AWS."
-        return str(results)
-    except (requests.Timeout, requests.RequestException) as e:
-        return str(e)
+    if not health_data and not announcement_data:
+        return "There are no current health incidents or announcements reported by AWS."
+    return str(results)
 
 
 @tool
-async def get_aws_health_history(start_time: str, end_time: str) -> str:
+async def get_aws_health_history(
+    start_time: str, end_time: str, region: str = None, service: str = None
+) -> str:
     """
     Fetches AWS health history incidents within the specified time frame.
 
     Parameters:
         start_time (str): The start of the time frame in ISO 8601 format.
         end_time (str): The end of the time frame in ISO 8601 format.
+        region (str): Optional AWS region code to narrow the results, e.g. "us-east-1".
+        service (str): Optional AWS service to narrow the results, e.g. "ec2".
 
     Returns:
         str: A JSON string representing the filtered events within the time frame.
     """
-    try:
-        response = requests.get(
-            "https://history-events-us-west-2-prod.s3.amazonaws.com/historyevents.json",
-            timeout=10,
-        )
-        response.raise_for_status()
-        history_data = response.json()
-    except (requests.Timeout, requests.RequestException) as e:
-        return str(e)
+    history_index = await history_events_feed.get()
+    start = iso_8601_to_unix(start_time)
+    end = iso_8601_to_unix(end_time)
 
     filtered_history = {}
 
-    for region, events in history_data.items():
-        filtered_events = []
-        for event in events:
-            event["date"] = await unix_to_iso_8601(event["date"])
-            if start_time <= event["date"] <= end_time:
-                for log in event.get("event_log", []):
-                    log["timestamp"] = await unix_to_iso_8601(log["timestamp"])
-                filtered_events.append(event)
-
-        if filtered_events:
-            filtered_history[region] = filtered_events
+    for key, events in history_index.query(start, end, region, service).items():
+        filtered_history[key] = [
+            {
+                **event,
+                "date": await unix_to_iso_8601(event["date"]),
+                "event_log": [
+                    {**log, "timestamp": await unix_to_iso_8601(log["timestamp"])}
+                    for log in event.get("event_log", [])
+                ],
+            }
+            for event in events
+        ]
 
     if filtered_history:
         return str(filtered_history)
@@ -291,26 +416,47 @@ async def get_aws_health_history(start_time: str, end_time: str) -> str:
 
 
 @tool
-async def get_available_services(region_name: str) -> str:
+async def get_available_services(
+    region_names: list[str] | None = None, service_name: str | None = None
+) -> str:
     """
-    Checks and lists all services available in a given AWS region.
+    Checks and lists all services available in one or more AWS regions, or the regions where a given service is available.
 
     Parameters:
-    region_name (str): The AWS region to check.
+    region_names (list[str]): The AWS regions to check, e.g. ["us-east-1", "eu-west-1"].
+    service_name (str): Optional AWS service endpoint name, e.g. "bedrock". When given, lists the regions where it is available, limited to region_names if those are given too.
 
     Returns:
-    str: A string listing all available services in the region.
+    str: A string listing the available services per region, or the regions of the service.
     """
-    try:
-        session = boto3.Session(region_name=region_name)
-        available_services = session.get_available_services()
+    if not region_names and not service_name:
+        return SERVICES_MISSING_ARGUMENTS_ERROR
+
+    index = get_service_index()
+    region_names = [region_name.strip().lower() for region_name in region_names or []]
 
-        result = ", ".join(available_services)
+    if service_name:
+        regions = index.regions(service_name)
+        if regions is None:
+            return SERVICE_NOT_FOUND_ERROR.format(service_name)
+
+        if region_names:
+            regions = [region for region in regions if region in region_names]
+
+        return SERVICE_REGIONS.format(service_name, len(regions), ", ".join(regions))
+
+    results = []
+    for region_name in region_names:
+        available_services = index.services(region_name)
+        if available_services is None:
+            results.append(REGION_NOT_FOUND_ERROR.format(region_name))
+            continue
+
+        result = f"{region_name}: " + ", ".join(available_services)
         result += f"\nTotal {len(available_services)} avaliable."
+        results.append(result)
 
-        return result
-    except Exception as e:
-        return str(e)
+    return "\n\n".join(results)
 
 
 @tool
@@ -324,31 +470,19 @@ async def search_duckduckgo(query: str) -> str:
     Returns:
     str: A JSON-like string representation of the search results.
     """
-    wrapper = DuckDuckGoSearchAPIWrapper(safesearch="strict", max_results=10)
-    search = DuckDuckGoSearchResults(api_wrapper=wrapper)
-
-    try:
-        results = await search.ainvoke(query)
-        return str(results)
-    except Exception as e:
-        return str(e)
+    return await search_results.get(query)
 
 
 @tool
-async def url_loader(url: str) -> str:
+async def url_loader(url: str, query: str | None = None) -> str:
     """
     Loads and retrieves the content of a given URL. Takes one url at a time.
 
     Parameters:
     url (str): The URL of the web page to load and retrieve content from.
+    query (str): Optional description of the information needed from the page, used to return only the most relevant passages of long pages.
 
     Returns:
     str: The content of the web page as a string.
     """
-    try:
-        loader = UnstructuredURLLoader(urls=[url])
-        data = loader.load()
-
-        return str(data[0].page_content)
-    except Exception as e:
-        return str(e)
+    return await load_url(url, query)
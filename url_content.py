@@ -0,0 +1,307 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+from http_client import get_http_client
+from prompts import *
+
+URL_LOADER_MAX_BYTES = int(os.getenv("URL_LOADER_MAX_BYTES", str(2 * 2**20)))
+URL_LOADER_MAX_CHARS = int(os.getenv("URL_LOADER_MAX_CHARS", "8000"))
+URL_LOADER_CHUNK_CHARS = int(os.getenv("URL_LOADER_CHUNK_CHARS", "800"))
+URL_LOADER_WORKERS = int(os.getenv("URL_LOADER_WORKERS", "2"))
+URL_LOADER_CACHE_TTL = float(os.getenv("URL_LOADER_CACHE_TTL", "600"))
+URL_LOADER_CACHE_MAX_ENTRIES = int(os.getenv("URL_LOADER_CACHE_MAX_ENTRIES", "256"))
+
+# Only elements whose end tag cannot be left out, so a missing </head> or </p>
+# never hides the rest of a page.
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "title"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "figcaption", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th",
+    "tr", "ul",
+}  # fmt: skip
+WORD_PATTERN = re.compile(r"\w+")
+
+_extractor_pool = ThreadPoolExecutor(
+    max_workers=URL_LOADER_WORKERS, thread_name_prefix="url_loader"
+)
+
+
+class html_text_extractor(HTMLParser):
+    """
+    Collects the visible text of an HTML document, one paragraph per block element.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+        self.paragraphs = []
+        self.current = []
+        self.skipped_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: list):
+        if tag in SKIPPED_TAGS:
+            self.skipped_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.end_paragraph()
+
+    def handle_endtag(self, tag: str):
+        if tag in SKIPPED_TAGS:
+            self.skipped_depth = max(self.skipped_depth - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.end_paragraph()
+
+    def handle_data(self, data: str):
+        if not self.skipped_depth:
+            self.current.append(data)
+
+    def end_paragraph(self):
+        paragraph = " ".join("".join(self.current).split())
+        if paragraph:
+            self.paragraphs.append(paragraph)
+
+        self.current = []
+
+
+def extract_text(content: bytes, encoding: str, is_html: bool) -> list[str]:
+    """
+    Decodes a downloaded page and splits its visible text into paragraphs.
+    """
+    text = content.decode(encoding or "utf-8", errors="replace")
+
+    if not is_html:
+        paragraphs = (" ".join(line.split()) for line in text.split("\n\n"))
+        return [paragraph for paragraph in paragraphs if paragraph]
+
+    extractor = html_text_extractor()
+    extractor.feed(text)
+    extractor.close()
+    extractor.end_paragraph()
+
+    return extractor.paragraphs
+
+
+def chunk_paragraphs(paragraphs: list[str], chunk_chars: int) -> list[str]:
+    """
+    Merges paragraphs into chunks of about chunk_chars characters, splitting
+    paragraphs that are longer on their own.
+    """
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        while len(paragraph) > chunk_chars:
+            cut = paragraph.rfind(" ", 0, chunk_chars)
+            cut = cut if cut > 0 else chunk_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:cut])
+            paragraph = paragraph[cut:].strip()
+
+        if current and len(current) + len(paragraph) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+
+        current = f"{current}\n{paragraph}" if current else paragraph
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def select_chunks(chunks: list[str], query: str | None, max_chars: int) -> list[str]:
+    """
+    Picks the chunks most relevant to a query, scored with BM25 over their words,
+    until max_chars is reached. Without a query, the leading chunks are picked.
+
+    Returns:
+    list[str]: The selected chunks, in document order.
+    """
+    if not chunks:
+        return []
+
+    order = range(len(chunks))
+
+    terms = set(WORD_PATTERN.findall(query.lower())) if query else set()
+    if terms:
+        counts = [Counter(WORD_PATTERN.findall(chunk.lower())) for chunk in chunks]
+        lengths = [sum(count.values()) or 1 for count in counts]
+        average_length = sum(lengths) / len(lengths)
+        frequencies = {
+            term: sum(1 for count in counts if term in count) for term in terms
+        }
+
+        def score(i: int) -> float:
+            total = 0.0
+            for term in terms:
+                tf = counts[i][term]
+                if tf:
+                    idf = math.log(
+                        1
+                        + (len(chunks) - frequencies[term] + 0.5)
+                        / (frequencies[term] + 0.5)
+                    )
+                    total += (
+                        idf
+                        * tf
+                        * 2.2
+                        / (tf + 1.2 * (0.25 + 0.75 * lengths[i] / average_length))
+                    )
+            return total
+
+        order = sorted(order, key=score, reverse=True)
+
+    selected = []
+    used = 0
+    for i in order:
+        if used + len(chunks[i]) > max_chars:
+            if selected:
+                continue
+            chunks[i] = chunks[i][:max_chars]
+
+        selected.append(i)
+        used += len(chunks[i])
+
+    return [chunks[i] for i in sorted(selected)]
+
+
+class url_content_cache:
+    """
+    LRU cache of extracted page text keyed by URL.
+
+    Entries younger than ttl are served as is. Older entries are revalidated with
+    If-None-Match/If-Modified-Since, so unchanged pages are not downloaded or
+    parsed again.
+
+    Parameters:
+    ttl (float): Seconds an entry is served without revalidation.
+    max_entries (int): Maximum number of cached pages.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.entries: OrderedDict[str, tuple[list[str], str, str, float]] = (
+            OrderedDict()
+        )
+
+        self.hits = 0
+        self.not_modified = 0
+        self.downloads = 0
+        self.truncated = 0
+        self.errors = 0
+
+    async def get(self, url: str) -> list[str]:
+        """
+        Returns the paragraphs of a page, downloading at most URL_LOADER_MAX_BYTES.
+
+        Raises:
+        Exception: The download error, or an unsupported content type.
+        """
+        entry = self.entries.get(url)
+        if entry is not None:
+            self.entries.move_to_end(url)
+            if time.monotonic() - entry[3] < self.ttl:
+                self.hits += 1
+                return entry[0]
+
+        headers = {}
+        if entry is not None:
+            if entry[1]:
+                headers["If-None-Match"] = entry[1]
+            if entry[2]:
+                headers["If-Modified-Since"] = entry[2]
+
+        try:
+            async with get_http_client().stream(
+                "GET", url, headers=headers
+            ) as response:
+                if response.status_code == 304 and entry is not None:
+                    self.not_modified += 1
+                    self.put(url, entry[0], entry[1], entry[2])
+                    return entry[0]
+
+                response.raise_for_status()
+
+                content_type = response.headers.get("Content-Type", "").lower()
+                is_html = "html" in content_type or "xml" in content_type
+                if content_type and not is_html and "text" not in content_type:
+                    raise ValueError(URL_UNSUPPORTED_CONTENT_ERROR.format(content_type))
+
+                content = bytearray()
+                async for data in response.aiter_bytes():
+                    content += data
+                    if len(content) >= URL_LOADER_MAX_BYTES:
+                        del content[URL_LOADER_MAX_BYTES:]
+                        self.truncated += 1
+                        break
+
+                paragraphs = await asyncio.get_running_loop().run_in_executor(
+                    _extractor_pool,
+                    extract_text,
+                    bytes(content),
+                    response.encoding,
+                    is_html or not content_type,
+                )
+                self.downloads += 1
+
+                self.put(
+                    url,
+                    paragraphs,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                )
+
+                return paragraphs
+        except Exception as e:
+            print(e)
+
+            self.errors += 1
+
+            raise
+
+    def put(self, url: str, paragraphs: list[str], etag: str, last_modified: str):
+        self.entries[url] = (paragraphs, etag, last_modified, time.monotonic())
+        self.entries.move_to_end(url)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "pages": len(self.entries),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "downloads": self.downloads,
+            "truncated": self.truncated,
+            "errors": self.errors,
+        }
+
+
+url_contents = url_content_cache(URL_LOADER_CACHE_TTL, URL_LOADER_CACHE_MAX_ENTRIES)
+
+
+async def load_url(url: str, query: str | None = None) -> str:
+    """
+    Returns the text of a page, cut to the URL_LOADER_MAX_CHARS characters most
+    relevant to query.
+    """
+    paragraphs = await url_contents.get(url)
+    chunks = chunk_paragraphs(
+        paragraphs, min(URL_LOADER_CHUNK_CHARS, URL_LOADER_MAX_CHARS)
+    )
+    selected = select_chunks(chunks, query, URL_LOADER_MAX_CHARS)
+
+    text = "\n\n".join(selected)
+    if len(selected) < len(chunks):
+        text += "\n\n" + URL_CONTENT_TRUNCATED.format(len(selected), len(chunks))
+
+    return text
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+
+_duckduckgo = None
+
+
+async def duckduckgo_search(query: str) -> str:
+    """
+    Searches DuckDuckGo with strict safe search through a client shared by every
+    call. langchain_community is only imported by the first search.
+    """
+    global _duckduckgo
+
+    if _duckduckgo is None:
+        from langchain_community.tools import DuckDuckGoSearchResults
+        from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+
+        wrapper = DuckDuckGoSearchAPIWrapper(safesearch="strict", max_results=10)
+        _duckduckgo = DuckDuckGoSearchResults(api_wrapper=wrapper)
+
+    return str(await _duckduckgo.ainvoke(query))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class search_cache:
+    """
+    TTL cache of search results keyed by normalized query, bounded by number of
+    entries. Concurrent misses for the same query wait on one upstream request.
+    Failed searches are not cached.
+
+    Parameters:
+    search (Callable): Async function returning the results of a query.
+    ttl (float): Seconds results are reused.
+    max_entries (int): Maximum number of cached queries.
+    """
+
+    def __init__(
+        self,
+        search: Callable[[str], Awaitable[str]],
+        ttl: float,
+        max_entries: int,
+    ):
+        self.search = search
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.in_flight: dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.errors = 0
+
+    async def get(self, query: str) -> str:
+        key = normalize_query(query)
+
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self.fetch(key))
+            self.in_flight[key] = task
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
+
+    async def fetch(self, key: str) -> str:
+        try:
+            results = await self.search(key)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            del self.in_flight[key]
+
+        self.entries[key] = (results, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "queries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "errors": self.errors,
+        }
+
+
+search_results = search_cache(
+    duckduckgo_search, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES
+)